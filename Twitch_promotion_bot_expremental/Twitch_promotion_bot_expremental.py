@@ -1,15 +1,37 @@
+import time
+startup_started = time.monotonic()  # Start of the startup timing report, before discord.py and twitchAPI are imported
+
 import os
 import discord
 from discord.ext import commands
 from discord import app_commands
-from twitchAPI.twitch import Twitch
 import asyncio
 from dotenv import load_dotenv
-import json
 import logging
+import re
 from datetime import datetime, timedelta
+import sqlite3
 import sys
-import glob
+import threading
+from helix_poller import fetch_live_statuses, lookup_user_ids, resolve_user_ids
+from helix_cache import TTLCache
+from helix_client import HelixClient
+from helix_transport import HelixTransport
+from rate_limiter import TokenBucket, request_reserve
+from eventsub import EventSubReceiver, sync_subscriptions, EVENTSUB_SUBSCRIPTION_TYPES
+from poll_scheduler import PollScheduler
+from streamer_store import StreamerStore
+from state_journal import StateJournal
+from stream_state import StreamState, StreamStateTracker, EVENT_TYPES, WENT_LIVE, WENT_OFFLINE, VIEWER_MILESTONE
+from announcer import AnnouncementQueue
+from embed_factory import EmbedFactory
+from roster_views import RosterIndex, RosterPageView
+from supervisor import Supervisor
+from metrics import MetricsRegistry, MetricsServer
+from roster_shards import LeaseCoordinator, RosterPartition
+from loop_watchdog import LoopWatchdog, SamplingProfiler
+from command_sync import sync_commands_if_changed
+from log_pipeline import setup_logging, compress_log, remove_old_logs, remove_files, format_size, DISCORD_ATTACHMENT_LIMIT
 
 # Load environment variables from .env file
 load_dotenv()
@@ -23,57 +45,256 @@ ALLOWED_ROLE_IDS = [int(role_id) for role_id in os.getenv('ALLOWED_ROLE_IDS').sp
 ALLOWED_CHANNEL_ID = int(os.getenv('ALLOWED_CHANNEL_ID'))  
 LOG_CHANNEL_ID = int(os.getenv('LOG_CHANNEL_ID'))  
 GUILD_ID = int(os.getenv('GUILD_ID'))
+COMMAND_HASH_FILE = "command_tree_hash.json"  # Hash of the last synced command tree, commands are only re-synced when it changes
 MAX_LOG_FILES = 7  # Keep logs for 7 days
+LOG_FILE = "bot_logs.txt"
+LOG_DIR = os.path.dirname(os.path.abspath(LOG_FILE))  # Rotated logs and /toggle_profiler profiles
+MAX_PROFILE_FILES = 5  # Profiles kept next to the logs, older ones are removed when a new one is saved
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(20 * 1024 * 1024)))  # Roll over early if a day's log gets this big
+LOG_JSON = os.getenv('LOG_JSON', '').lower() in ('1', 'true', 'yes')  # Write the log file as JSON lines
+LOG_UPLOAD_PART_BYTES = int(os.getenv('LOG_UPLOAD_PART_BYTES', str(DISCORD_ATTACHMENT_LIMIT)))  # Largest compressed part per upload
 NOTIFICATION_COOLDOWN = 300  # 5 minutes in seconds between notifications for the same user
-
-# File to store the list of Twitch usernames
+HELIX_CONCURRENCY = int(os.getenv('HELIX_CONCURRENCY', '4'))  # Helix requests in flight at once during a check
+HELIX_RATE_LIMIT = int(os.getenv('HELIX_RATE_LIMIT', '800'))  # Points per minute, resized from Twitch's Ratelimit headers
+HELIX_POOL_SIZE = int(os.getenv('HELIX_POOL_SIZE', '10'))  # Keep-alive connections to the Twitch API
+MANUAL_CHECK_RESERVE = HELIX_RATE_LIMIT // 4  # Tokens manual checks leave for the scheduled sweep
+POLL_INTERVAL = 60  # Seconds between sweeps when polling is the only source of go-live events
+
+# Optional EventSub push mode (enabled when both the public callback URL and the secret are set)
+EVENTSUB_CALLBACK_URL = os.getenv('EVENTSUB_CALLBACK_URL')  # Public https URL that forwards to the local receiver
+EVENTSUB_SECRET = os.getenv('EVENTSUB_SECRET')
+EVENTSUB_HOST = os.getenv('EVENTSUB_HOST', '0.0.0.0')
+EVENTSUB_PORT = int(os.getenv('EVENTSUB_PORT', '8080'))
+EVENTSUB_ENABLED = bool(EVENTSUB_CALLBACK_URL and EVENTSUB_SECRET)
+EVENTSUB_RECONCILE_INTERVAL = 900  # Streamers with working EventSub subscriptions are only polled every 15 minutes to reconcile missed events
+EVENTSUB_STREAM_LOOKUP_RETRIES = 3  # get_streams can lag a few seconds behind stream.online
+
+# Partitioning: workers sharing SHARD_COORDINATOR_DB (and TWITCH_USERNAMES_DB) each poll a consistent-hash slice
+# of the roster. To run several workers on one host:
+#   - start every worker in its own directory, so logs, caches and the state journal stay per worker
+#   - point SHARD_COORDINATOR_DB and TWITCH_USERNAMES_DB of all of them at the same two files
+#   - give each worker its own WORKER_INDEX (0, 1, 2, ...); it offsets METRICS_PORT so every worker can serve metrics
+#   - use the same token and the same EVENTSUB_* settings everywhere: every worker connects to Discord, but only the
+#     leader (the live worker with the lowest WORKER_ID) answers slash commands, syncs the command tree, runs the
+#     EventSub receiver and manages the subscriptions, and another worker takes over if it stops
+SHARD_COORDINATOR_DB = os.getenv('SHARD_COORDINATOR_DB')
+WORKER_INDEX = int(os.getenv('WORKER_INDEX', '0'))
+WORKER_ID = os.getenv('WORKER_ID')  # Defaults to <hostname>-<pid>
+SHARD_LEASE_TTL = 30  # A worker that misses heartbeats for this many seconds leaves the ring
+LEADERSHIP_CHECK_INTERVAL = SHARD_LEASE_TTL / 3  # How often the EventSub receiver follows a change of leader
+
+# Local Prometheus-style metrics endpoint (enabled when METRICS_PORT is set, plus WORKER_INDEX per worker)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+
+# Event loop watchdog: ticks that are late by more than this many seconds log the blocking stack
+LOOP_LAG_THRESHOLD = float(os.getenv('LOOP_LAG_THRESHOLD', '0.25'))
+
+# Adaptive polling: streamers near their usual start times are checked every POLL_HOT_INTERVAL seconds,
+# streamers that stay offline back off exponentially up to POLL_MAX_INTERVAL seconds
+POLL_HOT_INTERVAL = 30
+POLL_MAX_INTERVAL = int(os.getenv('POLL_MAX_INTERVAL', '900'))
+POLL_REQUEST_BUDGET = int(os.getenv('POLL_REQUEST_BUDGET', '120'))  # Helix requests per minute the sweep may spend
+
+# SQLite database with the monitored Twitch users (the old JSON list is migrated into it once)
+TWITCH_USERNAMES_DB = os.getenv('TWITCH_USERNAMES_DB', "twitch_usernames.db")
 TWITCH_USERNAMES_FILE = "twitch_usernames.json"
 
-# Load Twitch usernames from file (if it exists)
-def load_twitch_usernames():
-    if os.path.exists(TWITCH_USERNAMES_FILE):
-        with open(TWITCH_USERNAMES_FILE, "r") as file:
-            return json.load(file)
-    return []
-
-# Save Twitch usernames to file
-def save_twitch_usernames(usernames):
-    with open(TWITCH_USERNAMES_FILE, "w") as file:
-        json.dump(usernames, file)
-
-# List of Twitch usernames to monitor (loaded from file)
-TWITCH_USERNAMES = load_twitch_usernames()
-
-# Initialize logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("bot_logs.txt"),
-        logging.StreamHandler()
-    ]
-)
+# Journal of live/notification state so a restart does not re-announce streams that are already live
+STATE_JOURNAL_FILE = "bot_state.journal"
+
+# On-disk store for resolved Twitch user ids and game names
+HELIX_CACHE_FILE = "helix_cache.db"
+USER_ID_CACHE_TTL = 86400  # Monitored streamers resolve through the user id the roster stores, this covers the rest
+GAME_NAME_CACHE_TTL = 604800  # Game names rarely change, keep them for a week
+UNKNOWN_LOGIN_CACHE_TTL = 600  # Logins Twitch does not know, so repeated typos in /add_twitch_user cost one lookup
+USER_ID_CACHE_MIN_ENTRIES = int(os.getenv('USER_ID_CACHE_MIN_ENTRIES', '10000'))  # Grows to twice the roster past this
+
+# /add_twitch_user checks the name against Twitch, giving up after this many seconds (Discord's deadline is 3)
+ADD_USER_LOOKUP_TIMEOUT = 2.0
+TWITCH_LOGIN_PATTERN = re.compile(r"[A-Za-z0-9_]{1,25}")
+
+# Initialize logging (queued, written and rotated by a background thread)
+log_file_handler, log_listener = setup_logging(LOG_FILE, LOG_MAX_BYTES, LOG_JSON)
 
-# Initialize Discord bot with sharding
-intents = discord.Intents.default()
-intents.members = True
-bot = commands.Bot(command_prefix="/", intents=intents, shard_count=2)  # Adjust shard_count as needed
+# Twitch usernames to monitor, set-backed view over the database
+TWITCH_USERNAMES = StreamerStore(TWITCH_USERNAMES_DB, json_path=TWITCH_USERNAMES_FILE)
+
+# Sorted roster for /remove_twitch_user autocomplete and the /list_twitch_users pages
+roster_index = RosterIndex(TWITCH_USERNAMES)
+
+# Initialize Discord bot with sharding. A closed client cannot be reopened, so restarting the gateway connection
+# builds a new bot (recreate_bot) and every use goes through this global.
+def create_bot():
+    intents = discord.Intents.default()
+    intents.members = True
+    new_bot = commands.Bot(command_prefix="/", intents=intents, shard_count=2)  # Adjust shard_count as needed
+    new_bot.tree.interaction_check = leader_interaction_check
+    return new_bot
+
+# With several workers on one token every worker receives every interaction, only the leader handles them
+async def leader_interaction_check(interaction):
+    return is_leader()
+
+bot = create_bot()
+
+# Set once the gateway is ready, cleared while it is being restarted; unlike bot.wait_until_ready() it carries over
+# to the bot that replaces a closed one
+gateway_ready = asyncio.Event()
 
 # Initialize Twitch API
 twitch = None
 
+# Process-wide Helix rate limiter shared by the background sweep and the slash commands
+helix_rate_limiter = TokenBucket(HELIX_RATE_LIMIT, 60)
+
+# Pooled keep-alive HTTP session for all Twitch traffic, kept across Twitch client restarts
+helix_transport = HelixTransport(limit_per_host=HELIX_POOL_SIZE)
+
 # Global variable to control log upload
 log_upload_enabled = True
 
-# Dictionary to track last notification times and retry counts
-last_notification_times = {}
-connection_retry_count = 0
-last_stream_info = {}  # Store last stream info to avoid duplicate messages
+# A sweep walks the whole roster, so an LRU smaller than it evicts every login just before it is needed again.
+# Renamed streamers hold two keys, hence twice the roster.
+def user_id_cache_size():
+    return max(USER_ID_CACHE_MIN_ENTRIES, 2 * len(TWITCH_USERNAMES))
+
+# Caches for the login -> user_id and game_id -> game name lookups
+user_id_cache = TTLCache("user_ids", USER_ID_CACHE_TTL, max_entries=user_id_cache_size(), store_path=HELIX_CACHE_FILE)
+game_name_cache = TTLCache("game_names", GAME_NAME_CACHE_TTL, store_path=HELIX_CACHE_FILE)
+unknown_login_cache = TTLCache("unknown_logins", UNKNOWN_LOGIN_CACHE_TTL)
+
+# Last known live state per streamer, shared by polling and EventSub; sweeps diff against it and only
+# transitions (went live, went offline, title/game change, viewer milestone) reach the subscribers below
+stream_states = StreamStateTracker()
+stream_state_rows = {}  # Journal form of stream_states, written by the persistence subscriber
+
+# Restore the state from before the last restart; every change to it goes through state_journal.record.
+# last_statuses and last_notification_times are only read to migrate journals from before the state records.
+legacy_statuses = {}
+legacy_notification_times = {}
+state_journal = StateJournal(STATE_JOURNAL_FILE, {
+    'streams': stream_state_rows,
+    'last_statuses': legacy_statuses,
+    'last_notification_times': legacy_notification_times
+})
+state_journal.load()
+if legacy_statuses or legacy_notification_times:
+    for username in legacy_statuses.keys() | legacy_notification_times.keys():
+        row = StreamState(legacy_statuses.get(username, False), went_live_at=legacy_notification_times.get(username, 0)).to_row()
+        stream_state_rows.setdefault(username, row)
+    legacy_statuses.clear()
+    legacy_notification_times.clear()
+    try:
+        state_journal.compact()
+        logging.info(f"Migrated the live state of {len(stream_state_rows)} streamers to state records")
+    except OSError as e:
+        logging.error(f"Error compacting migrated state journal {STATE_JOURNAL_FILE}: {e}")
+stream_states.restore(stream_state_rows)
+
+# Go-live announcements are queued and sent by a separate task so Discord never stalls the sweep
+announcement_queue = AnnouncementQueue(lambda channel_id: bot.get_channel(channel_id))
+embed_factory = EmbedFactory()
+
+# EventSub webhook receiver (only created in push mode)
+eventsub_receiver = None
+
+# EventSub subscriptions known to deliver, as (type, user_id), and the roster login of each subscribed user id.
+# Streamers with both an online and an offline subscription here are polled at the reconcile interval.
+eventsub_active = set()
+eventsub_logins = {}
+
+# Per-streamer next-check times for the background sweep. The short intervals are the fallback for streamers
+# without working EventSub subscriptions (all of them when push mode is off).
+poll_scheduler = PollScheduler(
+    base_interval=POLL_INTERVAL,
+    hot_interval=POLL_HOT_INTERVAL,
+    max_interval=POLL_MAX_INTERVAL,
+    request_budget=POLL_REQUEST_BUDGET,
+    push_interval=EVENTSUB_RECONCILE_INTERVAL
+)
+
+# Restarts failed components (Twitch client, polling task, gateway connection) with backoff and per-component
+# circuit breakers; its failure/restart counters replace the old global connection retry count
+supervisor = Supervisor()
+
+# Continuous event loop lag measurement, and the sampling profiler while /toggle_profiler has it running
+loop_watchdog = LoopWatchdog(LOOP_LAG_THRESHOLD)
+profiler = None
+
+# This worker's slice of the roster (None when the whole roster is polled by one process)
+roster_partition = None
+if SHARD_COORDINATOR_DB:
+    roster_partition = RosterPartition(LeaseCoordinator(SHARD_COORDINATOR_DB, WORKER_ID, SHARD_LEASE_TTL))
+
+# True for the worker that does the once-per-bot work, always without partitioning
+def is_leader():
+    return roster_partition is None or roster_partition.is_leader
+
+# Metrics for sizing polling cadence and shard count, served by metrics_server
+metrics = MetricsRegistry()
+sweep_duration = metrics.histogram("twitchbot_sweep_duration_seconds", "Time spent fetching live statuses per sweep")
+sweep_streamers = metrics.histogram(
+    "twitchbot_sweep_streamers", "Streamers checked per sweep", buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+)
+helix_request_duration = metrics.histogram("twitchbot_helix_request_duration_seconds", "Helix request latency", ("endpoint",))
+helix_requests = metrics.counter("twitchbot_helix_requests_total", "Helix requests by endpoint and status", ("endpoint", "status"))
+metrics.callback("twitchbot_helix_rate_limited_total", "Helix 429s and exhausted buckets", "counter", lambda: helix_rate_limiter.rate_limited)
+metrics.callback("twitchbot_helix_throttled_total", "Helix requests that waited for a rate limit token", "counter", lambda: helix_rate_limiter.throttled)
+metrics.callback("twitchbot_cache_hits_total", "Helix cache hits", "counter", lambda: {
+    (user_id_cache.name,): user_id_cache.hits, (game_name_cache.name,): game_name_cache.hits
+}, ("cache",))
+metrics.callback("twitchbot_cache_misses_total", "Helix cache misses", "counter", lambda: {
+    (user_id_cache.name,): user_id_cache.misses, (game_name_cache.name,): game_name_cache.misses
+}, ("cache",))
+metrics.callback("twitchbot_announcements_sent_total", "Go-live announcements sent", "counter", lambda: announcement_queue.announcements_sent)
+metrics.callback("twitchbot_announcement_messages_total", "Discord messages sent for announcements", "counter", lambda: announcement_queue.messages_sent)
+metrics.callback("twitchbot_announcement_edits_total", "Announcement messages edited in place", "counter", lambda: announcement_queue.messages_edited)
+metrics.callback("twitchbot_announcement_failures_total", "Announcements that could not be sent", "counter", lambda: announcement_queue.send_failures)
+metrics.callback("twitchbot_announcement_retries_total", "Announcement sends retried after a failure", "counter", lambda: announcement_queue.send_retries)
+metrics.callback("twitchbot_announcement_queue_depth", "Announcements waiting to be sent", "gauge", announcement_queue.depth)
+metrics.callback(
+    "twitchbot_golive_announcement_lag_seconds", "Seconds from stream start to the announcement being sent, last announcement",
+    "gauge", lambda: announcement_queue.live_lag
+)
+metrics.callback("twitchbot_monitored_streamers", "Streamers being monitored", "gauge", lambda: len(TWITCH_USERNAMES))
+metrics.callback("twitchbot_polled_streamers", "Streamers polled by this worker", "gauge", lambda: len(poll_scheduler.next_check))
+metrics.callback("twitchbot_eventsub_streamers", "Streamers whose go-lives arrive through EventSub", "gauge", lambda: len(poll_scheduler.pushed))
+metrics.callback(
+    "twitchbot_roster_rebalances_total", "Times the roster was repartitioned between workers", "counter",
+    lambda: roster_partition.rebalances if roster_partition else None
+)
+metrics.callback("twitchbot_component_failures_total", "Supervised component failures", "counter", lambda: {
+    (component.name,): component.retries for component in supervisor.components.values()
+}, ("component",))
+metrics.callback("twitchbot_component_restarts_total", "Supervised component restarts", "counter", lambda: {
+    (component.name,): component.restarts for component in supervisor.components.values()
+}, ("component",))
+metrics.callback("twitchbot_circuit_open", "1 while a component's circuit breaker is open", "gauge", lambda: {
+    (component.name,): int(not component.breaker.allow()) for component in supervisor.components.values()
+}, ("component",))
+metrics.callback("twitchbot_helix_connections_opened_total", "Connections opened to the Twitch API", "counter", lambda: helix_transport.connections_created)
+metrics.callback("twitchbot_helix_connections_reused_total", "Twitch API requests sent on a pooled connection", "counter", lambda: helix_transport.connections_reused)
+metrics.callback("twitchbot_event_loop_lag_seconds", "Largest event loop lag over the last minute", "gauge", loop_watchdog.recent_max_lag)
+metrics.callback("twitchbot_event_loop_stalls_total", "Times the event loop was blocked past the watchdog threshold", "counter", lambda: loop_watchdog.stalls)
+stream_events = metrics.counter("twitchbot_stream_events_total", "Stream state transitions by event", ("event",))
+metrics.callback("twitchbot_live_streamers", "Monitored streamers currently live", "gauge", lambda: stream_states.live_count)
+metrics_server = None
+
+def record_helix_request(endpoint, status, seconds):
+    helix_request_duration.observe(seconds, endpoint)
+    helix_requests.inc(endpoint, str(status))
+
+# Seconds spent in each startup step, logged once the first sweep has run
+startup_timings = {}
 
 async def init_twitch():
     global twitch
     try:
-        twitch = await Twitch(TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET)
+        twitch = await HelixClient(
+            TWITCH_CLIENT_ID, TWITCH_CLIENT_SECRET,
+            rate_limiter=helix_rate_limiter, on_request=record_helix_request, transport=helix_transport
+        )
         logging.info("Successfully initialized Twitch API")
         return True
     except Exception as e:
@@ -81,137 +302,305 @@ async def init_twitch():
         return False
 
 async def is_user_live(username):
+    statuses = await fetch_live_statuses(twitch, [username], user_id_cache, game_name_cache, HELIX_CONCURRENCY, TWITCH_USERNAMES)
+    return statuses.get(username, {'is_live': False})
+
+# True or False if Twitch does or does not know the login, None if it could not be checked in time
+async def twitch_user_exists(username):
+    login = username.lower()
+    if user_id_cache.get(login) is not None:
+        return True
+    if unknown_login_cache.get(login) is not None:
+        return False
+    if twitch is None or not supervisor.available('twitch'):
+        return None
+    errors = {}
     try:
-        async for user in twitch.get_users(logins=[username]):
-            user_id = user.id
-            async for stream in twitch.get_streams(user_id=[user_id]):
-                # Get game/category information
-                game_id = stream.game_id
-                game_name = "Unknown Game"
-                if game_id:
-                    async for game in twitch.get_games(game_ids=[game_id]):
-                        game_name = game.name
-                
-                return {
-                    'is_live': True,
-                    'title': stream.title,
-                    'game': game_name,
-                    'viewers': stream.viewer_count,
-                    'thumbnail': stream.thumbnail_url
-                }
-        return {'is_live': False}
-    except Exception as e:
-        logging.error(f"Error checking if user is live: {e}")
-        return {'is_live': False, 'error': str(e)}
+        user_ids = await asyncio.wait_for(resolve_user_ids(twitch, [login], errors), ADD_USER_LOOKUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    if errors:
+        return None
+    if user_ids:
+        user_id_cache.set_many((resolved, user_id) for user_id, resolved in user_ids.items())
+        return True
+    unknown_login_cache.set(login, "1")
+    return False
+
+# Feed one live status (from a sweep or EventSub) to the diff engine, the subscribers below act on its transitions
+def update_stream_status(username, stream_info, current_time):
+    stream_states.apply(username, stream_info, current_time)
+
+# Announcements subscriber: post go-lives, edit title/game changes in right away and viewer counts at milestones
+def announce_stream_event(event):
+    username, stream_info = event.username, event.stream_info
+    if event.kind == WENT_LIVE:
+        # With several workers, the one that claims the stream first announces it (e.g. right after a rebalance)
+        if roster_partition is None or roster_partition.claim_announcement(username, stream_info.get('started_at')):
+            embed = embed_factory.build(username, stream_info)
+            announcement_queue.enqueue(DISCORD_CHANNEL_ID, username, embed, stream_info.get('started_at'))
+            logging.info(f"Queued live stream announcement for {username} playing {stream_info['game']}")
+        else:
+            logging.info(f"{username} was already announced by another worker")
+    elif event.kind == WENT_OFFLINE:
+        announcement_queue.forget(username)
+    elif event.kind != VIEWER_MILESTONE or announcement_queue.wants_update(username, stream_info['title']):
+        announcement_queue.enqueue_update(DISCORD_CHANNEL_ID, username, embed_factory.build(username, stream_info))
+
+# Persistence subscriber: journal the state record, and mirror live state into the streamer store
+def persist_stream_event(event):
+    state_journal.record('streams', event.username, event.state.to_row())
+    if event.kind == WENT_LIVE:
+        TWITCH_USERNAMES.update_state(event.username, user_id=event.state.user_id, is_live=True, last_notified=event.time)
+    elif event.kind == WENT_OFFLINE:
+        TWITCH_USERNAMES.update_state(event.username, is_live=False)
+
+# Metrics subscriber
+def count_stream_event(event):
+    stream_events.inc(event.kind)
+    if event.kind == VIEWER_MILESTONE:
+        logging.info(f"{event.username} reached {stream_states.milestone_viewers(event.state)} viewers")
+
+stream_states.subscribe(EVENT_TYPES, announce_stream_event)
+stream_states.subscribe(EVENT_TYPES, persist_stream_event)
+stream_states.subscribe(EVENT_TYPES, count_stream_event)
+
+# Drop a streamer's live state (removed from the roster, or now polled by another worker)
+def forget_stream_state(username):
+    announcement_queue.forget(username)
+    if stream_states.forget(username):
+        state_journal.record('streams', username, None)
+
+# Forget the live state of streamers another worker now owns, so it is not stale if they come back to this worker
+def drop_handed_over_state(roster):
+    owned = set(roster)
+    for username in [username for username in stream_states.states if username not in owned]:
+        forget_stream_state(username)
+
+# One sweep over the streamers that are due, returns the live statuses it fetched
+async def run_sweep(current_time):
+    TWITCH_USERNAMES.reload_if_changed()  # Another worker may have changed the shared roster
+    user_id_cache.resize(user_id_cache_size())
+    roster = TWITCH_USERNAMES if roster_partition is None else roster_partition.owned(TWITCH_USERNAMES)
+    poll_scheduler.sync(roster, current_time)
+    if roster_partition is not None:
+        drop_handed_over_state(roster)
+        if not roster_partition.is_leader:
+            # EventSub coverage as published by the leader, which receives the go-lives for every worker
+            poll_scheduler.set_pushed({username for username in roster if username.lower() in roster_partition.pushed}, current_time)
+
+    # Only check the streamers the scheduler says are due, skipping users still in their notification cooldown
+    due_usernames = []
+    for username in poll_scheduler.due(current_time):
+        cooldown_left = NOTIFICATION_COOLDOWN - (current_time - stream_states.went_live_at(username))
+        if cooldown_left > 0:
+            poll_scheduler.schedule(username, current_time + cooldown_left)
+        else:
+            due_usernames.append(username)
+
+    # One batched sweep for the due streamers instead of three calls per user
+    requests_before = helix_rate_limiter.acquired
+    sweep_started = time.monotonic()
+    statuses = await fetch_live_statuses(twitch, due_usernames, user_id_cache, game_name_cache, HELIX_CONCURRENCY, TWITCH_USERNAMES)
+    if due_usernames:
+        sweep_duration.observe(time.monotonic() - sweep_started)
+        sweep_streamers.observe(len(due_usernames))
+    poll_scheduler.record_requests(helix_rate_limiter.acquired - requests_before, current_time)
+
+    for username, stream_info in statuses.items():
+        poll_scheduler.record_result(username, stream_info, current_time)
+        if stream_info.get('error'):
+            logging.error(f"Error checking {username}: {stream_info['error']}")
+            continue
+        update_stream_status(username, stream_info, current_time)
+    return statuses
 
 async def check_live_status():
-    await bot.wait_until_ready()
-    channel = bot.get_channel(DISCORD_CHANNEL_ID)
-    last_statuses = {username: False for username in TWITCH_USERNAMES if username}
-
-    while not bot.is_closed():
+    while True:
+        await gateway_ready.wait()  # Pauses while the supervisor restarts the gateway connection
         try:
-            for username in TWITCH_USERNAMES:
-                if not username:
-                    continue
-                
-                # Check if we should skip due to cooldown
-                current_time = datetime.now().timestamp()
-                last_notified = last_notification_times.get(username, 0)
-                if current_time - last_notified < NOTIFICATION_COOLDOWN:
-                    continue
-                
-                stream_info = await is_user_live(username)
-                
-                if stream_info.get('error'):
-                    logging.error(f"Error checking {username}: {stream_info['error']}")
-                    continue
-                
-                if stream_info['is_live'] and not last_statuses[username]:
-                    # Check if stream info has changed significantly
-                    current_stream_key = f"{username}_{stream_info['title']}_{stream_info['game']}"
-                    if current_stream_key != last_stream_info.get(username):
-                        # Create rich embed for the notification
-                        embed = discord.Embed(
-                            title=stream_info['title'],
-                            description=f"{username} is now live on Twitch!",
-                            color=discord.Color.purple(),
-                            url=f"https://twitch.tv/{username}"
-                        )
-                        embed.add_field(name="Game", value=stream_info['game'], inline=True)
-                        embed.add_field(name="Viewers", value=stream_info['viewers'], inline=True)
-                        if stream_info['thumbnail']:
-                            thumbnail_url = stream_info['thumbnail'].format(width=320, height=180)
-                            embed.set_thumbnail(url=thumbnail_url)
-                        
-                        await channel.send(f"@everyone {username} is live!", embed=embed)
-                        last_notification_times[username] = current_time
-                        last_stream_info[username] = current_stream_key
-                        logging.info(f"Announced live stream for {username} playing {stream_info['game']}")
-                    
-                    last_statuses[username] = True
-                elif not stream_info['is_live']:
-                    last_statuses[username] = False
-                    last_stream_info.pop(username, None)  # Remove from last stream info when offline
+            await run_sweep(datetime.now().timestamp())
+
+            if 'first_sweep' not in startup_timings:
+                startup_timings['first_sweep'] = time.monotonic() - startup_started
+                log_startup_report()
             
-            await asyncio.sleep(60)  # Check every 60 seconds
+            # Sleep until the next streamer is due (streamers covered by EventSub are only reconciled)
+            await asyncio.sleep(poll_scheduler.seconds_until_next(datetime.now().timestamp(), POLL_INTERVAL))
         
         except Exception as e:
             logging.error(f"Error in check_live_status loop: {e}")
-            await handle_connection_error()
+            await supervisor.recover('twitch', init_twitch, e)
 
-async def handle_connection_error():
-    global connection_retry_count
-    
-    connection_retry_count += 1
-    if connection_retry_count > 10:
-        logging.error("Max retries reached. Waiting 10 minutes before restarting...")
-        await asyncio.sleep(600)  # Wait 10 minutes
-        await restart_bot()
+# Handle a stream.online / stream.offline notification from EventSub
+async def handle_eventsub_event(subscription_type, event):
+    login = event.get('broadcaster_user_login', '').lower()
+    username = TWITCH_USERNAMES.lookup(login)
+    if username is None:
+        return
+    current_time = datetime.now().timestamp()
+
+    if subscription_type == 'stream.offline':
+        update_stream_status(username, {'is_live': False}, current_time)
+        return
+
+    if current_time - stream_states.went_live_at(username) < NOTIFICATION_COOLDOWN:
+        return
+    # The notification has no title/game/viewers, fetch them (Helix may need a moment to list the stream)
+    for attempt in range(EVENTSUB_STREAM_LOOKUP_RETRIES):
+        stream_info = await is_user_live(username)
+        if stream_info['is_live']:
+            update_stream_status(username, stream_info, current_time)
+            return
+        if attempt + 1 < EVENTSUB_STREAM_LOOKUP_RETRIES:
+            await asyncio.sleep(5 * (attempt + 1))
+    logging.warning(f"{username} went live but the stream is not listed yet, leaving it to the next sweep")
+
+# Poll streamers with both subscriptions delivering at the reconcile interval, and the rest at the short intervals
+def update_push_coverage():
+    pushed = {
+        username for user_id, username in eventsub_logins.items()
+        if all((subscription_type, user_id) in eventsub_active for subscription_type in EVENTSUB_SUBSCRIPTION_TYPES)
+    }
+    poll_scheduler.set_pushed(pushed, datetime.now().timestamp())
+    if roster_partition is not None:
+        try:
+            roster_partition.coordinator.set_pushed(pushed)  # The other workers poll their slice of these less often
+        except sqlite3.Error as e:
+            logging.error(f"Error publishing EventSub coverage: {e}")
+
+# Twitch verified (enabled) or revoked one of our subscriptions
+def handle_eventsub_status(subscription_type, user_id, enabled):
+    if enabled:
+        eventsub_active.add((subscription_type, user_id))
     else:
-        wait_time = min(connection_retry_count * 60, 600)  # Max 10 minutes
-        logging.error(f"Connection error detected. Waiting {wait_time} seconds before retry...")
-        await asyncio.sleep(wait_time)
-        
-        # Reinitialize Twitch connection
-        if not await init_twitch():
-            await handle_connection_error()
+        eventsub_active.discard((subscription_type, user_id))
+    update_push_coverage()
 
-async def restart_bot():
-    logging.info("Attempting to restart bot...")
-    python = sys.executable
-    os.execl(python, python, *sys.argv)
+# Subscribe to stream.online / stream.offline for every monitored user
+async def sync_eventsub_subscriptions():
+    global eventsub_active, eventsub_logins
+    if not EVENTSUB_ENABLED or eventsub_receiver is None:
+        return
+    try:
+        logins = list(dict.fromkeys(username.lower() for username in TWITCH_USERNAMES if username))
+        user_ids = await lookup_user_ids(twitch, logins, {}, user_id_cache, HELIX_CONCURRENCY, TWITCH_USERNAMES)
+        statuses = await sync_subscriptions(twitch, user_ids, EVENTSUB_CALLBACK_URL, EVENTSUB_SECRET, HELIX_CONCURRENCY)
+        eventsub_logins = {user_id: TWITCH_USERNAMES.lookup(login) or login for user_id, login in user_ids.items()}
+        # Twitch's listing wins; subscriptions it did not list were created by this sync and keep their verification
+        eventsub_active = {key for key in eventsub_active if key not in statuses} | {key for key, enabled in statuses.items() if enabled}
+    except Exception as e:
+        logging.error(f"Error syncing EventSub subscriptions: {e}")
+        eventsub_active.clear()  # Unknown, poll everyone at the short intervals until the next sync
+    update_push_coverage()
+
+# Run the EventSub receiver and keep the subscriptions synced while this worker is the leader (Twitch has a single
+# callback URL for the bot). Twitch revokes webhooks that keep failing without being able to tell us, so the
+# subscriptions are re-checked every reconcile interval.
+async def run_eventsub():
+    global eventsub_receiver
+    next_sync = 0
+    while True:
+        if is_leader():
+            if eventsub_receiver is None:
+                receiver = EventSubReceiver(
+                    EVENTSUB_SECRET, handle_eventsub_event, EVENTSUB_HOST, EVENTSUB_PORT, on_status=handle_eventsub_status
+                )
+                try:
+                    await receiver.start()
+                    eventsub_receiver = receiver
+                    next_sync = 0
+                except OSError as e:
+                    # The previous leader may not have released the port yet
+                    logging.error(f"Error starting the EventSub receiver on port {EVENTSUB_PORT}: {e}")
+                    poll_scheduler.set_pushed(set(), datetime.now().timestamp())  # Poll everyone until it is running
+            if eventsub_receiver is not None and time.monotonic() >= next_sync:
+                await sync_eventsub_subscriptions()
+                next_sync = time.monotonic() + EVENTSUB_RECONCILE_INTERVAL
+        elif eventsub_receiver is not None:
+            logging.info("Stopping the EventSub receiver, another worker is the leader now")
+            await eventsub_receiver.stop()
+            eventsub_receiver = None
+            eventsub_active.clear()
+            poll_scheduler.set_pushed(set(), datetime.now().timestamp())
+        await asyncio.sleep(LEADERSHIP_CHECK_INTERVAL)
 
 @bot.event
 async def on_ready():
+    # Fires again after every gateway reconnect, the one-time startup work lives in start_background_work
+    gateway_ready.set()
     logging.info(f'Logged in as {bot.user.name}')
-    if not await init_twitch():
-        await handle_connection_error()
-    bot.loop.create_task(check_live_status())
 
-    # Sync commands to the specific guild
+# Await a startup step and record how long it took
+async def timed_startup(name, coro):
+    started = time.monotonic()
+    try:
+        return await coro
+    finally:
+        startup_timings[name] = time.monotonic() - started
+
+def log_startup_report():
+    report = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_timings.items())
+    logging.info(f"Startup timing - {report}")
+
+# Sync commands to the specific guild, skipped when the command tree has not changed since the last sync
+async def sync_commands():
     try:
         guild = discord.Object(id=GUILD_ID)
-        synced = await bot.tree.sync(guild=guild)
-        logging.info(f"Synced {len(synced)} commands to guild {GUILD_ID}.")
+        synced = await sync_commands_if_changed(bot.tree, guild, bot.application_id, COMMAND_HASH_FILE)
+        if synced is not None:
+            logging.info(f"Synced {synced} commands to guild {GUILD_ID}.")
     except Exception as e:
-        logging.error(f"Error syncing commands: {e}")
-        await handle_connection_error()
-
-# Clean up old log files
-def clean_up_logs():
+        logging.error(f"Error syncing commands: {e}")  # No hash is saved, so the next start tries again
+
+# Runs once per process: Twitch auth overlaps the Discord login and the first sweep starts as soon as both are done
+async def start_background_work():
+    twitch_ready = asyncio.create_task(timed_startup('twitch_auth', init_twitch()))
+    await timed_startup('gateway_login', gateway_ready.wait())
+    if is_leader():
+        asyncio.create_task(timed_startup('command_sync', sync_commands()))
+    if not await twitch_ready:
+        await supervisor.recover('twitch', init_twitch, "initial authentication failed")
+    asyncio.create_task(supervisor.run('poller', check_live_status))
+    if EVENTSUB_ENABLED:
+        asyncio.create_task(run_eventsub())
+
+# Clean up old log files in a worker thread, keeping only the most recent MAX_LOG_FILES (and the most recent
+# MAX_LOG_FILES that still have to be uploaded)
+async def clean_up_logs():
     try:
-        log_files = glob.glob("bot_logs_*.txt")
-        log_files.sort()
-        
-        # Keep only the most recent MAX_LOG_FILES files
-        if len(log_files) > MAX_LOG_FILES:
-            for old_log in log_files[:-MAX_LOG_FILES]:
-                os.remove(old_log)
-                logging.info(f"Removed old log file: {old_log}")
+        removed = await asyncio.to_thread(remove_old_logs, "bot_logs_*.txt", MAX_LOG_FILES, log_file_handler.pending_files())
+        for old_log in removed:
+            logging.info(f"Removed old log file: {old_log}")
     except Exception as e:
         logging.error(f"Error cleaning up log files: {e}")
 
+# Every worker uploads its own logs, they are named after the worker when several of them post to the log channel
+def log_upload_name(log_file_name):
+    name = os.path.basename(log_file_name)
+    return name if roster_partition is None else f"{roster_partition.worker_id}/{name}"
+
+# Compress a rotated log file in a worker thread and upload it in parts under the attachment limit
+async def upload_log_file(log_channel, log_file_name):
+    parts, original_size, compressed_size = await asyncio.to_thread(compress_log, log_file_name, LOG_UPLOAD_PART_BYTES)
+    try:
+        start_time = time.monotonic()
+        for number, part in enumerate(parts, 1):
+            await log_channel.send(
+                f"{log_upload_name(log_file_name)} part {number}/{len(parts)}",
+                file=discord.File(part, os.path.basename(part))
+            )
+        upload_time = time.monotonic() - start_time
+    finally:
+        await asyncio.to_thread(remove_files, parts)  # The uncompressed log is kept for retention
+    ratio = original_size / compressed_size if compressed_size else 1.0
+    summary = (
+        f"Uploaded {log_upload_name(log_file_name)}: {format_size(original_size)} compressed to "
+        f"{format_size(compressed_size)} ({ratio:.1f}x) in {len(parts)} part(s), upload took {upload_time:.1f}s"
+    )
+    await log_channel.send(summary)
+    logging.info(summary)
+
 # Function to upload logs to a specific channel
 async def upload_logs():
     global log_upload_enabled
@@ -220,42 +609,36 @@ async def upload_logs():
         logging.info("Log upload is currently disabled.")
         return
 
-    clean_up_logs()  # Clean up old logs before uploading new one
-
-    # Get the current date for the log file name
-    current_date = datetime.now().strftime("%Y-%m-%d")
-    log_file_name = f"bot_logs_{current_date}.txt"
-
-    # Close the logging handler to release the file
-    for handler in logging.root.handlers[:]:
-        if isinstance(handler, logging.FileHandler):
-            handler.close()
-            logging.root.removeHandler(handler)
-
-    # Rename the log file with the current date
-    if os.path.exists("bot_logs.txt"):
-        os.rename("bot_logs.txt", log_file_name)
-
-        # Reinitialize the logging handler
-        file_handler = logging.FileHandler("bot_logs.txt")
-        file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-        logging.root.addHandler(file_handler)
+    try:
+        # Roll the log file over and upload everything rotated and not uploaded yet
+        log_file_names = log_file_handler.rotate()
+        if not log_file_names:
+            logging.warning("No log file found to upload.")
+            return
 
-        # Upload the log file to the specified channel
         log_channel = bot.get_channel(LOG_CHANNEL_ID)
-        if log_channel:
-            with open(log_file_name, "rb") as log_file:
-                await log_channel.send(file=discord.File(log_file, log_file_name))
-            logging.info(f"Uploaded log file {log_file_name} to channel {LOG_CHANNEL_ID}.")
-        else:
+        if not log_channel:
             logging.error(f"Log channel with ID {LOG_CHANNEL_ID} not found.")
-    else:
-        logging.warning("No log file found to upload.")
+            return
+        for log_file_name in log_file_names:
+            try:
+                await upload_log_file(log_channel, log_file_name)
+                log_file_handler.mark_uploaded(log_file_name)
+            except Exception as e:
+                logging.error(f"Error uploading log file {log_file_name}: {e}")  # Stays pending for the next upload
+    finally:
+        await clean_up_logs()  # Only after the upload, so a freshly rotated log is not pruned before it went out
 
 # Schedule log upload every 24 hours
 async def schedule_log_upload():
-    await bot.wait_until_ready()
-    while not bot.is_closed():
+    while True:
+        await gateway_ready.wait()
+        # Record the daily cache hit/miss counters in the log that is about to be uploaded
+        logging.info(f"Helix cache stats - {user_id_cache.stats()}; {game_name_cache.stats()}")
+        logging.info(f"Discord {announcement_queue.stats()}")
+        logging.info(f"Supervisor - {supervisor.stats()}")
+        logging.info(f"Twitch HTTP session - {helix_transport.stats()}")
+        logging.info(f"Event loop - {loop_watchdog.stats()}")
         await upload_logs()
         await asyncio.sleep(86400)  # 24 hours in seconds
 
@@ -313,12 +696,52 @@ async def toggle_log_upload(interaction: discord.Interaction):
     else:
         await interaction.followup.send("Toggle cancelled.", ephemeral=True)
 
+# Write a stopped profiler's profile to the log directory and prune old profiles. Blocking, meant to run in a worker thread.
+def save_profile(stopped_profiler):
+    profile_file_name = stopped_profiler.write(os.path.join(LOG_DIR, f"profile_{datetime.now():%Y-%m-%d_%H-%M-%S}.folded"))
+    for old_profile in remove_old_logs(os.path.join(LOG_DIR, "profile_*.folded"), MAX_PROFILE_FILES):
+        logging.info(f"Removed old profile: {old_profile}")
+    return profile_file_name
+
+# Slash command to start the sampling profiler, or stop it and upload the profile
+@bot.tree.command(name="toggle_profiler", description="Start or stop the sampling profiler", guild=discord.Object(id=GUILD_ID))
+@app_commands.check(has_allowed_role)
+@app_commands.check(is_allowed_channel)
+async def toggle_profiler(interaction: discord.Interaction):
+    global profiler
+    if profiler is None:
+        profiler = SamplingProfiler(threading.get_ident())  # Commands run on the event loop thread
+        profiler.start()
+        await interaction.response.send_message(
+            "Sampling profiler started. Run `/toggle_profiler` again to stop it and get the profile.", ephemeral=True
+        )
+        logging.info(f"{interaction.user} started the sampling profiler.")
+        return
+
+    await interaction.response.defer(ephemeral=True)
+    running_profiler, profiler = profiler, None
+    seconds, samples = await asyncio.to_thread(running_profiler.stop)
+    profile_file_name = await asyncio.to_thread(save_profile, running_profiler)
+    await interaction.followup.send(
+        f"Profiled {seconds:.0f}s ({samples} samples). Open the file with speedscope or flamegraph.pl.",
+        file=discord.File(profile_file_name),
+        ephemeral=True
+    )
+    logging.info(f"{interaction.user} stopped the sampling profiler after {seconds:.0f}s, profile saved to {profile_file_name}.")
+
 # Slash command to add a Twitch user
 @bot.tree.command(name="add_twitch_user", description="Add a Twitch user to the monitoring list", guild=discord.Object(id=GUILD_ID))
 @app_commands.describe(username="The Twitch username to add")
 @app_commands.check(has_allowed_role)
 @app_commands.check(is_allowed_channel)
 async def adduser(interaction: discord.Interaction, username: str):
+    username = username.strip()
+    if not TWITCH_LOGIN_PATTERN.fullmatch(username):
+        await interaction.response.send_message(
+            f"{username} is not a valid Twitch username (letters, numbers and underscores, at most 25 characters).",
+            ephemeral=True
+        )
+        return
     if username in TWITCH_USERNAMES:
         await interaction.response.send_message(
             f"{username} is already in the list: https://twitch.tv/{username}", 
@@ -326,6 +749,13 @@ async def adduser(interaction: discord.Interaction, username: str):
         )
         logging.info(f"{interaction.user} tried to add an already monitored user: {username}")
         return
+
+    exists = await twitch_user_exists(username)
+    if exists is False:
+        await interaction.response.send_message(f"There is no Twitch user called {username}.", ephemeral=True)
+        logging.info(f"{interaction.user} tried to add an unknown Twitch user: {username}")
+        return
+    unverified = " (could not be checked on Twitch right now)" if exists is None else ""
     
     # Create confirmation view
     class ConfirmView(discord.ui.View):
@@ -351,7 +781,7 @@ async def adduser(interaction: discord.Interaction, username: str):
 
     view = ConfirmView()
     await interaction.response.send_message(
-        f"Are you sure you want to add {username} to monitoring? Profile: https://twitch.tv/{username}", 
+        f"Are you sure you want to add {username} to monitoring{unverified}? Profile: https://twitch.tv/{username}", 
         view=view, 
         ephemeral=True
     )
@@ -360,8 +790,8 @@ async def adduser(interaction: discord.Interaction, username: str):
     if view.value is None:
         await interaction.followup.send("Add user cancelled (timed out).", ephemeral=True)
     elif view.value:
-        TWITCH_USERNAMES.append(username)
-        save_twitch_usernames(TWITCH_USERNAMES)
+        TWITCH_USERNAMES.add(username)
+        asyncio.create_task(sync_eventsub_subscriptions())
         await interaction.followup.send(
             f"Added {username} to the monitoring list: https://twitch.tv/{username}", 
             ephemeral=True
@@ -417,8 +847,12 @@ async def removeuser(interaction: discord.Interaction, username: str):
     if view.value is None:
         await interaction.followup.send("Remove user cancelled (timed out).", ephemeral=True)
     elif view.value:
-        TWITCH_USERNAMES.remove(username)
-        save_twitch_usernames(TWITCH_USERNAMES)
+        # The live state, embed template and announcements are keyed by the login as it was added
+        login = TWITCH_USERNAMES.lookup(username) or username
+        TWITCH_USERNAMES.remove(login)
+        embed_factory.forget(login)
+        forget_stream_state(login)
+        asyncio.create_task(sync_eventsub_subscriptions())
         await interaction.followup.send(
             f"Removed {username} from the monitoring list: https://twitch.tv/{username}", 
             ephemeral=True
@@ -427,6 +861,11 @@ async def removeuser(interaction: discord.Interaction, username: str):
     else:
         await interaction.followup.send("Remove user cancelled.", ephemeral=True)
 
+# Suggest monitored users as the name is typed, from the sorted roster index
+@removeuser.autocomplete('username')
+async def removeuser_autocomplete(interaction: discord.Interaction, current: str):
+    return [app_commands.Choice(name=login, value=login) for login in roster_index.complete(current)]
+
 # Slash command to list monitored Twitch users (in embed)
 @bot.tree.command(name="list_twitch_users", description="List all monitored Twitch users", guild=discord.Object(id=GUILD_ID))
 @app_commands.check(has_allowed_role)
@@ -436,16 +875,10 @@ async def listusers(interaction: discord.Interaction):
         await interaction.response.send_message("No users are currently being monitored.", ephemeral=True)
         logging.info(f"{interaction.user} listed monitored users: No users being monitored.")
     else:
-        # Create an embed to display the list of monitored users
-        embed = discord.Embed(
-            title="Monitored Twitch Channels",
-            description="Here are the Twitch users currently being monitored:",
-            color=discord.Color.purple()
-        )
-        for username in TWITCH_USERNAMES:
-            embed.add_field(name="", value=f"[{username}](https://twitch.tv/{username})", inline=False)
-        await interaction.response.send_message(embed=embed, ephemeral=True)
-        logging.info(f"{interaction.user} listed monitored users: {TWITCH_USERNAMES}")
+        # Pages are rendered once per roster change, the buttons only flip between cached embeds
+        view = RosterPageView(roster_index, interaction.user) if roster_index.page_count() > 1 else discord.utils.MISSING
+        await interaction.response.send_message(embed=roster_index.page(0), view=view, ephemeral=True)
+        logging.info(f"{interaction.user} listed monitored users: {len(TWITCH_USERNAMES)} users")
 
 # Slash command to change bot status
 @bot.tree.command(name="set_twitch_bot_status", description="Change the bot's status", guild=discord.Object(id=GUILD_ID))
@@ -610,10 +1043,19 @@ async def clearactivity(interaction: discord.Interaction):
 @app_commands.check(is_allowed_channel)
 async def checklive(interaction: discord.Interaction):
     await interaction.response.defer(ephemeral=True)  # Acknowledge the interaction immediately
+    if not supervisor.available('twitch'):
+        retry_in = supervisor.component('twitch').breaker.seconds_until_retry()
+        await interaction.followup.send(f"The Twitch API is unavailable right now, retrying in {retry_in:.0f} seconds.", ephemeral=True)
+        return
     live_users = []
 
-    for username in TWITCH_USERNAMES:
-        stream_info = await is_user_live(username)
+    # Leave part of the rate limit to the scheduled sweep so a manual check cannot starve it
+    reserve_token = request_reserve.set(MANUAL_CHECK_RESERVE)
+    try:
+        statuses = await fetch_live_statuses(twitch, TWITCH_USERNAMES, user_id_cache, game_name_cache, HELIX_CONCURRENCY, TWITCH_USERNAMES)
+    finally:
+        request_reserve.reset(reserve_token)
+    for username, stream_info in statuses.items():
         if stream_info.get('is_live'):
             live_users.append((username, stream_info))
 
@@ -659,21 +1101,9 @@ async def checklive(interaction: discord.Interaction):
             await interaction.followup.send("Confirmation timed out.", ephemeral=True)
             logging.info(f"{interaction.user} timed out while checking live streams.")
         elif view.value:
-            # Post the results to the channel with rich embeds
-            channel = bot.get_channel(DISCORD_CHANNEL_ID)
+            # Queue the results for the channel with rich embeds (users going live together share a message)
             for user, info in live_users:
-                embed = discord.Embed(
-                    title=info['title'],
-                    description=f"{user} is now live on Twitch!",
-                    color=discord.Color.purple(),
-                    url=f"https://twitch.tv/{user}"
-                )
-                embed.add_field(name="Game", value=info['game'], inline=True)
-                embed.add_field(name="Viewers", value=info['viewers'], inline=True)
-                if info['thumbnail']:
-                    thumbnail_url = info['thumbnail'].format(width=320, height=180)
-                    embed.set_thumbnail(url=thumbnail_url)
-                await channel.send(f"@everyone {user} is live!", embed=embed)
+                announcement_queue.enqueue(DISCORD_CHANNEL_ID, user, embed_factory.build(user, info))
             
             await interaction.followup.send("Live stream results posted.", ephemeral=True)
             logging.info(f"{interaction.user} posted live stream results: {[user[0] for user in live_users]}")
@@ -702,12 +1132,12 @@ async def help(interaction: discord.Interaction):
     )
     embed.add_field(
         name="2. **/remove_twitch_user**",
-        value="Remove a Twitch user from the monitoring list.\n**Usage:** `/removeuser username:<Twitch username>`",
+        value="Remove a Twitch user from the monitoring list (names are suggested as you type).\n**Usage:** `/removeuser username:<Twitch username>`",
         inline=False
     )
     embed.add_field(
         name="3. **/list_twitch_users**",
-        value="List all monitored Twitch users.\n**Usage:** `/listusers`",
+        value="List all monitored Twitch users, 25 per page.\n**Usage:** `/listusers`",
         inline=False
     )
     embed.add_field(
@@ -740,6 +1170,11 @@ async def help(interaction: discord.Interaction):
         value="Turn on or off the log upload feature.\n**Usage:** `/toggle_log_upload`",
         inline=False
     )
+    embed.add_field(
+        name="10. **/toggle_profiler**",
+        value="Start the sampling profiler, or stop it and get a flamegraph profile of the bot.\n**Usage:** `/toggle_profiler`",
+        inline=False
+    )
     await interaction.response.send_message(embed=embed, ephemeral=True)
     logging.info(f"{interaction.user} requested help.")
 
@@ -761,16 +1196,61 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
 if sys.platform == 'win32':
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-# Use the setup_hook to schedule tasks after the bot has started
-@bot.event
-async def setup_hook():
-    bot.loop.create_task(schedule_log_upload())
-
-try:
-    bot.run(DISCORD_TOKEN)
-except Exception as e:
-    logging.error(f"Bot crashed: {e}")
-    # Attempt to restart after a delay
-    asyncio.run(asyncio.sleep(60))
-    python = sys.executable
-    os.execl(python, python, *sys.argv)
\ No newline at end of file
+# Start the tasks that live for the whole process (not in setup_hook, which runs again when the gateway is restarted)
+async def start_services():
+    global metrics_server
+    asyncio.create_task(loop_watchdog.run())
+    asyncio.create_task(schedule_log_upload())
+    asyncio.create_task(announcement_queue.run())
+    if METRICS_PORT:
+        metrics_server = MetricsServer(metrics, METRICS_HOST, METRICS_PORT + WORKER_INDEX)
+        await metrics_server.start()
+    if roster_partition is not None:
+        roster_partition.refresh()  # Join the ring before the first sweep so it only polls this worker's slice
+        asyncio.create_task(roster_partition.run())
+
+# New bot with the slash commands, command error handler and event handlers of a closed one
+def recreate_bot(old):
+    new = create_bot()
+    guild = discord.Object(id=GUILD_ID)
+    for command in old.tree.get_commands(guild=guild):
+        new.tree.add_command(command, guild=guild)
+    new.tree.error(old.tree.on_error)
+    new.event(on_ready)
+    return new
+
+# discord.py resumes dropped sessions itself and only gives up (closing the client) on errors such as an
+# invalidated session; log in again with a new bot instead of restarting the process
+async def run_gateway():
+    global bot
+    if bot.is_closed():
+        gateway_ready.clear()
+        bot = recreate_bot(bot)
+        await bot.login(DISCORD_TOKEN)
+    await bot.connect(reconnect=True)
+
+async def main():
+    startup_timings['import'] = time.monotonic() - startup_started
+    try:
+        await start_services()
+        asyncio.create_task(start_background_work())
+        await bot.login(DISCORD_TOKEN)
+        # discord.py logs through the root queue handler
+        await supervisor.run('gateway', run_gateway, fatal=(discord.LoginFailure, discord.PrivilegedIntentsRequired))
+    finally:
+        if roster_partition is not None:
+            roster_partition.coordinator.leave()  # Hand this worker's slice over without waiting for the lease to expire
+        await helix_transport.close()
+        await bot.close()  # The current bot, a gateway restart may have replaced the one logged in above
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        # Only unrecoverable errors such as an invalid token get here, restarting would fail the same way
+        logging.error(f"Bot crashed: {e}")
+        sys.exit(1)
+    finally:
+        log_listener.stop()  # Write out the queued records, including the crash above, before the interpreter exits
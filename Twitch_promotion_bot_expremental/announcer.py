@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+import discord
+
+from rate_limiter import TokenBucket
+
+DISCORD_MAX_EMBEDS = 10  # Discord accepts at most 10 embeds per message
+DISCORD_CHANNEL_RATE = 5  # Messages per channel per DISCORD_CHANNEL_PERIOD seconds
+DISCORD_CHANNEL_PERIOD = 5
+SEND_ATTEMPTS = 5  # Tries per announcement before it is dropped, the live state is already saved so nothing else retries it
+SEND_RETRY_DELAY = 5  # Seconds before the first retry, doubled for every further one
+
+
+# One queued go-live announcement, or an update to one that was already posted
+class Announcement:
+    __slots__ = ('channel_id', 'username', 'embed', 'enqueued_at', 'is_update', 'started_at', 'attempts')
+
+    def __init__(self, channel_id, username, embed, is_update=False, started_at=None):
+        self.channel_id = channel_id
+        self.username = username
+        self.embed = embed
+        self.enqueued_at = time.monotonic()
+        self.is_update = is_update
+        self.started_at = started_at  # When the stream went live (datetime), for the go-live lag
+        self.attempts = 0
+
+
+# Where a streamer's announcement embed lives, so it can be edited in place
+class PostedAnnouncement:
+    __slots__ = ('message', 'embeds', 'index', 'updated_at')
+
+    def __init__(self, message, embeds, index):
+        self.message = message
+        self.embeds = embeds  # Shared by every streamer coalesced into the same message
+        self.index = index
+        self.updated_at = time.monotonic()
+
+
+# Queue between the Twitch sweep and Discord: producers enqueue and return immediately,
+# a single consumer task coalesces announcements per channel and sends them within the channel's rate limit
+class AnnouncementQueue:
+    def __init__(self, get_channel, coalesce_window=2.0, edit_interval=300):
+        self.get_channel = get_channel
+        self.coalesce_window = coalesce_window
+        self.edit_interval = edit_interval  # Minimum seconds between viewer count edits of one announcement
+        self.queue = asyncio.Queue()
+        self.channel_buckets = {}  # channel id -> TokenBucket
+        self.posted = {}  # username -> PostedAnnouncement for streamers that are still live
+        self.announcements_sent = 0
+        self.messages_sent = 0
+        self.messages_edited = 0
+        self.send_failures = 0
+        self.send_retries = 0
+        self.retrying = set()  # Announcements waiting for their next attempt
+        self.send_latencies = deque(maxlen=500)  # Seconds from enqueue to delivered, most recent sends
+        self.live_lag = None  # Seconds from the stream going live to its announcement being sent, last send
+
+    def enqueue(self, channel_id, username, embed, started_at=None):
+        self.queue.put_nowait(Announcement(channel_id, username, embed, started_at=started_at))
+
+    # Title changes are edited in right away, viewer counts at most every edit_interval seconds
+    def wants_update(self, username, title):
+        posted = self.posted.get(username)
+        if posted is None:
+            return False
+        if posted.embeds[posted.index].title != title:
+            return True
+        return time.monotonic() - posted.updated_at >= self.edit_interval
+
+    def enqueue_update(self, channel_id, username, embed):
+        if username in self.posted:
+            self.queue.put_nowait(Announcement(channel_id, username, embed, is_update=True))
+
+    # Stop editing a streamer's announcement once they go offline, and give up on retrying it
+    def forget(self, username):
+        self.posted.pop(username, None)
+        self.retrying = {announcement for announcement in self.retrying if announcement.username != username}
+
+    def depth(self):
+        return self.queue.qsize()
+
+    # Announcements per message, 1.0 means nothing was coalesced
+    def coalescing_rate(self):
+        return self.announcements_sent / self.messages_sent if self.messages_sent else 1.0
+
+    def average_latency(self):
+        return sum(self.send_latencies) / len(self.send_latencies) if self.send_latencies else 0.0
+
+    def stats(self):
+        return (
+            f"announcements: {self.depth()} queued, {self.announcements_sent} sent in {self.messages_sent} messages "
+            f"({self.coalescing_rate():.2f} per message), {self.messages_edited} edits, {self.send_retries} retries, "
+            f"{len(self.retrying)} retrying, {self.send_failures} failed, "
+            f"{self.average_latency():.2f}s average send latency"
+        )
+
+    # Wait briefly after the first announcement so streamers going live together share a message
+    async def collect_batch(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.coalesce_window
+        while True:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def channel_bucket(self, channel_id):
+        bucket = self.channel_buckets.get(channel_id)
+        if bucket is None:
+            bucket = self.channel_buckets[channel_id] = TokenBucket(DISCORD_CHANNEL_RATE, DISCORD_CHANNEL_PERIOD)
+        return bucket
+
+    # Put announcements whose send failed back on the queue after a backoff, or drop them once they ran out of attempts
+    # (or the failure is permanent, such as missing permissions)
+    def retry_later(self, announcements, error, permanent=False):
+        loop = asyncio.get_running_loop()
+        for announcement in announcements:
+            announcement.attempts += 1
+            if permanent or announcement.attempts >= SEND_ATTEMPTS:
+                logging.error(f"Dropping announcement for {announcement.username} after {announcement.attempts} attempts: {error}")
+                self.send_failures += 1
+                continue
+            self.send_retries += 1
+            self.retrying.add(announcement)
+            loop.call_later(SEND_RETRY_DELAY * 2 ** (announcement.attempts - 1), self.requeue, announcement)
+
+    def requeue(self, announcement):
+        if announcement in self.retrying:  # Not forgotten in the meantime
+            self.retrying.discard(announcement)
+            self.queue.put_nowait(announcement)
+
+    async def send(self, channel_id, announcements):
+        channel = self.get_channel(channel_id)
+        if channel is None:
+            # Not cached yet, e.g. while the gateway reconnects
+            logging.error(f"Announcement channel {channel_id} not found, retrying {len(announcements)} announcements later")
+            self.retry_later(announcements, f"channel {channel_id} not found")
+            return
+        usernames = [announcement.username for announcement in announcements]
+        if len(usernames) == 1:
+            content = f"@everyone {usernames[0]} is live!"
+        else:
+            content = f"@everyone {', '.join(usernames[:-1])} and {usernames[-1]} are live!"
+        embeds = [announcement.embed for announcement in announcements]
+        await self.channel_bucket(channel_id).acquire()
+        try:
+            message = await channel.send(content, embeds=embeds)
+        except Exception as e:
+            logging.error(f"Error sending announcement for {', '.join(usernames)}: {e}")
+            self.retry_later(announcements, e, permanent=isinstance(e, (discord.Forbidden, discord.NotFound)))
+            return
+        for index, username in enumerate(usernames):
+            self.posted[username] = PostedAnnouncement(message, embeds, index)
+        now = time.monotonic()
+        self.send_latencies.extend(now - announcement.enqueued_at for announcement in announcements)
+        started = [announcement.started_at for announcement in announcements if announcement.started_at is not None]
+        if started:
+            self.live_lag = time.time() - max(started).timestamp()
+        self.announcements_sent += len(announcements)
+        self.messages_sent += 1
+        logging.info(f"Sent announcement for {', '.join(usernames)} to channel {channel_id}")
+
+    # Swap the updated embeds into their messages, one edit per message however many streamers changed
+    async def edit(self, channel_id, updates):
+        latest = {update.username: update for update in updates}
+        by_message = {}
+        for username, update in latest.items():
+            posted = self.posted.get(username)
+            if posted is None:
+                continue
+            posted.embeds[posted.index] = update.embed
+            posted.updated_at = time.monotonic()
+            by_message[posted.message.id] = posted
+        for posted in by_message.values():
+            await self.channel_bucket(channel_id).acquire()
+            try:
+                await posted.message.edit(embeds=posted.embeds)
+                self.messages_edited += 1
+            except Exception as e:
+                logging.error(f"Error editing announcement message {posted.message.id}: {e}")
+
+    # Consumer task, runs for the lifetime of the bot
+    async def run(self):
+        while True:
+            batch = await self.collect_batch()
+            by_channel = {}
+            updates = {}
+            for announcement in batch:
+                if announcement.is_update:
+                    updates.setdefault(announcement.channel_id, []).append(announcement)
+                else:
+                    by_channel.setdefault(announcement.channel_id, []).append(announcement)
+            for channel_id, channel_updates in updates.items():
+                await self.edit(channel_id, channel_updates)
+            for channel_id, announcements in by_channel.items():
+                for i in range(0, len(announcements), DISCORD_MAX_EMBEDS):
+                    await self.send(channel_id, announcements[i:i + DISCORD_MAX_EMBEDS])
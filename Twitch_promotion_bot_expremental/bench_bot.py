@@ -0,0 +1,320 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from aiohttp import web
+from bench_helix_poller import FakeHelix
+
+# Offline load test of the bot itself: drives run_sweep, /checklive, /add_twitch_user + /remove_twitch_user and the
+# /remove_twitch_user autocomplete
+# against a fake Helix server and a fake Discord channel, renders the /list_twitch_users pages and writes the results as JSON.
+# Every roster size runs in its own process and temporary directory, so memory and on-disk state do not carry over.
+# Usage: python bench_bot.py --sizes 10 1000 10000 --output bench_results.json
+
+BENCH_ENV = {
+    'DISCORD_TOKEN': "bench",
+    'TWITCH_CLIENT_ID': "bench",
+    'TWITCH_CLIENT_SECRET': "bench",
+    'DISCORD_CHANNEL_ID': "1",
+    'ALLOWED_ROLE_IDS': "2",
+    'ALLOWED_CHANNEL_ID': "3",
+    'LOG_CHANNEL_ID': "4",
+    'GUILD_ID': "5",
+    'POLL_REQUEST_BUDGET': "1000000"  # Let the first sweep check the whole roster at once
+}
+
+
+# Samples how late the event loop wakes up from a short sleep while the benchmark runs
+class LoopLagMonitor:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.lags = []
+        self.task = None
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - started - self.interval))
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    def summary(self):
+        if not self.lags:
+            return {'max_s': 0.0, 'p99_s': 0.0, 'mean_s': 0.0}
+        lags = sorted(self.lags)
+        return {
+            'max_s': round(lags[-1], 4),
+            'p99_s': round(lags[int(len(lags) * 0.99) - 1 if len(lags) >= 100 else -1], 4),
+            'mean_s': round(statistics.fmean(lags), 4)
+        }
+
+
+# Stand-ins for the Discord objects the bot touches: a text channel, its messages and a slash command interaction
+class FakeMessage:
+    def __init__(self, channel, message_id):
+        self.channel = channel
+        self.id = message_id
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(self.channel.latency)
+        self.channel.edits += 1
+
+
+class FakeChannel:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = 0
+        self.embeds = 0
+        self.edits = 0
+
+    async def send(self, content=None, embeds=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.messages += 1
+        self.embeds += len(embeds or [])
+        return FakeMessage(self, self.messages)
+
+
+class FakeUser:
+    name = "bench"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def defer(self, **kwargs):
+        pass
+
+    async def send_message(self, content=None, view=None, **kwargs):
+        self.interaction.answer(view)
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, content=None, view=None, **kwargs):
+        self.interaction.answer(view)
+
+
+# Presses the confirm (or cancel) button of any confirmation view the command shows
+class FakeInteraction:
+    def __init__(self, confirm=True):
+        self.confirm = confirm
+        self.user = FakeUser()
+        self.channel_id = int(BENCH_ENV['ALLOWED_CHANNEL_ID'])
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    def answer(self, view):
+        if view is not None:
+            view.value = self.confirm
+            view.stop()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+async def run_roster(args):
+    fake = FakeHelix(
+        args.run_size, live_ratio=args.live_ratio, latency=args.latency,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate
+    )
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.port).start()
+
+    rss_before_import = peak_rss_mb()
+    import Twitch_promotion_bot_expremental as bot_module
+    from helix_client import HelixClient
+
+    lag = LoopLagMonitor()
+    lag.start()
+    result = {'roster': args.run_size, 'rss_before_import_mb': rss_before_import}
+    try:
+        async with bot_module.bot:
+            channel = FakeChannel(args.discord_latency)
+            bot_module.announcement_queue.get_channel = lambda channel_id: channel
+            bot_module.announcement_queue.coalesce_window = 0.05
+            announcer = asyncio.create_task(bot_module.announcement_queue.run())
+            bot_module.twitch = await HelixClient(
+                'bench', 'bench',
+                rate_limiter=bot_module.helix_rate_limiter,
+                on_request=bot_module.record_helix_request,
+                transport=bot_module.helix_transport,
+                base_url=f"http://127.0.0.1:{args.port}/helix/",
+                auth_base_url=f"http://127.0.0.1:{args.port}/oauth2/"
+            )
+
+            started = time.perf_counter()
+            for login in fake.logins:
+                bot_module.TWITCH_USERNAMES.add(login)
+            result['roster_load_s'] = round(time.perf_counter() - started, 3)
+
+            # Cold sweep resolves every login, the warm one only asks for streams
+            sweeps = []
+            for name in ("cold", "warm"):
+                now = datetime.now(timezone.utc).timestamp()
+                for login in bot_module.TWITCH_USERNAMES:
+                    bot_module.poll_scheduler.schedule(login, now)
+                requests_before = sum(fake.requests.values())
+                started = time.perf_counter()
+                statuses = await bot_module.run_sweep(now)
+                elapsed = time.perf_counter() - started
+                sweeps.append({
+                    'sweep': name,
+                    'seconds': round(elapsed, 4),
+                    'requests': sum(fake.requests.values()) - requests_before,
+                    'checked': len(statuses),
+                    'live': sum(1 for info in statuses.values() if info.get('is_live')),
+                    'errors': sum(1 for info in statuses.values() if info.get('error'))
+                })
+            result['sweeps'] = sweeps
+
+            # Time until every go-live announcement from the cold sweep has reached the (fake) channel.
+            # Discord's per-channel rate limit makes this the slowest part of a large go-live burst.
+            queue = bot_module.announcement_queue
+            expected = sweeps[0]['live']
+            started = time.perf_counter()
+            while queue.announcements_sent + queue.send_failures < expected and time.perf_counter() - started < args.drain_timeout:
+                await asyncio.sleep(0.01)
+            result['announcements'] = {
+                'expected': expected,
+                'sent': queue.announcements_sent,
+                'messages': channel.messages,
+                'drain_s': round(time.perf_counter() - started, 3),
+                'average_latency_s': round(queue.average_latency(), 4)
+            }
+
+            requests_before = sum(fake.requests.values())
+            started = time.perf_counter()
+            await bot_module.checklive.callback(FakeInteraction(confirm=False))
+            result['checklive'] = {
+                'seconds': round(time.perf_counter() - started, 4),
+                'requests': sum(fake.requests.values()) - requests_before
+            }
+
+            # Names the add command validates against (fake) Helix before adding them
+            for i in range(args.commands):
+                fake.users[f"benchuser{i}"] = str(10 ** 9 + i)
+            for command, name in ((bot_module.adduser, 'add'), (bot_module.removeuser, 'remove')):
+                timings = []
+                for i in range(args.commands):
+                    started = time.perf_counter()
+                    await command.callback(FakeInteraction(), f"benchuser{i}")
+                    timings.append(time.perf_counter() - started)
+                result[name] = {'count': len(timings), 'mean_s': round(statistics.fmean(timings), 6), 'max_s': round(max(timings), 6)}
+
+            # remove_twitch_user autocomplete for every one and two letter prefix, after a roster change
+            bot_module.TWITCH_USERNAMES.add("benchextra")
+            prefixes = ["", "s", "st", "str", "streamer1", "b", "x"]
+            started = time.perf_counter()
+            for prefix in prefixes:
+                await bot_module.removeuser_autocomplete(FakeInteraction(), prefix)
+            result['autocomplete'] = {'count': len(prefixes), 'total_s': round(time.perf_counter() - started, 6)}
+            started = time.perf_counter()
+            pages = bot_module.roster_index.page_count()
+            for number in range(pages):
+                bot_module.roster_index.page(number)
+            result['list_pages'] = {'pages': pages, 'render_s': round(time.perf_counter() - started, 4)}
+
+            announcer.cancel()
+            result['helix_requests'] = dict(fake.requests)
+            result['connection_reuse'] = round(bot_module.helix_transport.reuse_rate(), 4)
+            await bot_module.helix_transport.close()
+    finally:
+        await lag.stop()
+        await runner.cleanup()
+    result['loop_lag'] = lag.summary()
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def run_in_subprocess(size, args):
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, **BENCH_ENV)
+        command = [
+            sys.executable, os.path.abspath(__file__), '--run-size', str(size),
+            '--latency', str(args.latency), '--discord-latency', str(args.discord_latency),
+            '--error-rate', str(args.error_rate), '--throttle-rate', str(args.throttle_rate),
+            '--live-ratio', str(args.live_ratio), '--commands', str(args.commands),
+            '--drain-timeout', str(args.drain_timeout), '--port', str(args.port)
+        ]
+        env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(os.path.abspath(__file__)), env.get('PYTHONPATH', '')])
+        completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            raise RuntimeError(f"Benchmark for {size} streamers failed:\n{completed.stderr[-2000:]}")
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the bot against local fake Helix and Discord endpoints")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--latency', type=float, default=0.02, help="Simulated Helix latency per request in seconds")
+    parser.add_argument('--discord-latency', type=float, default=0.05, help="Simulated Discord latency per message in seconds")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of Helix requests answered with a 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Share of Helix requests answered with an injected 429")
+    parser.add_argument('--live-ratio', type=float, default=0.2)
+    parser.add_argument('--commands', type=int, default=20, help="add/remove commands to run per roster size")
+    parser.add_argument('--drain-timeout', type=float, default=30, help="Seconds to wait for queued announcements to be sent")
+    parser.add_argument('--port', type=int, default=8782)
+    parser.add_argument('--output', default="bench_results.json")
+    parser.add_argument('--run-size', type=int, help=argparse.SUPPRESS)  # Internal: run one roster size in this process
+    args = parser.parse_args()
+
+    if args.run_size is not None:
+        import logging
+        result = asyncio.run(run_roster(args))
+        logging.shutdown()
+        print(json.dumps(result))
+        return
+
+    results = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'settings': {
+            'latency': args.latency, 'discord_latency': args.discord_latency, 'error_rate': args.error_rate,
+            'throttle_rate': args.throttle_rate, 'live_ratio': args.live_ratio, 'drain_timeout': args.drain_timeout
+        },
+        'runs': []
+    }
+    for size in args.sizes:
+        run = run_in_subprocess(size, args)
+        results['runs'].append(run)
+        cold, warm = run['sweeps']
+        print(
+            f"{size:>6} streamers: cold sweep {cold['seconds']:.3f}s/{cold['requests']} requests, "
+            f"warm sweep {warm['seconds']:.3f}s/{warm['requests']} requests, checklive {run['checklive']['seconds']:.3f}s, "
+            f"peak RSS {run['peak_rss_mb']} MB, max loop lag {run['loop_lag']['max_s']}s"
+        )
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
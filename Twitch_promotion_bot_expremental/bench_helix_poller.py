@@ -0,0 +1,206 @@
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter
+
+from aiohttp import web
+from helix_cache import TTLCache
+from helix_client import HelixClient
+from helix_transport import HelixTransport
+from helix_poller import fetch_live_statuses
+from rate_limiter import TokenBucket
+
+# Benchmark the batched poller against a local fake Helix server.
+# Usage: python bench_helix_poller.py --sizes 10 100 500 1000 --latency 0.02
+
+
+# Local stand-in for the Helix users/streams/games endpoints. error_rate and throttle_rate are the share of
+# requests answered with a 500 or an injected 429 (on top of the ones from the simulated points bucket).
+class FakeHelix:
+    def __init__(self, roster_size, live_ratio=0.2, game_count=30, latency=0.0, rate_limit=800, seed=0,
+                 error_rate=0.0, throttle_rate=0.0):
+        rng = random.Random(seed)
+        self.rng = random.Random(seed + 1)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.requests = Counter()
+        self.rate_limit = rate_limit
+        self.points = float(rate_limit)
+        self.points_updated_at = time.monotonic()
+        self.logins = [f"streamer{i}" for i in range(roster_size)]
+        self.users = {login: str(1000 + i) for i, login in enumerate(self.logins)}
+        self.games = {str(500 + i): f"Game {i}" for i in range(game_count)}
+        self.streams = {}
+        for login, user_id in self.users.items():
+            if rng.random() < live_ratio:
+                game_id = rng.choice(list(self.games))
+                self.streams[user_id] = {
+                    'id': f"s{user_id}",
+                    'user_id': user_id,
+                    'user_login': login,
+                    'user_name': login,
+                    'game_id': game_id,
+                    'game_name': self.games[game_id],
+                    'type': 'live',
+                    'title': f"{login} stream",
+                    'viewer_count': rng.randint(1, 5000),
+                    'started_at': '2025-01-01T00:00:00Z',
+                    'language': 'en',
+                    'thumbnail_url': 'https://example.invalid/{width}x{height}.jpg',
+                    'tag_ids': [],
+                    'is_mature': False,
+                    'tags': []
+                }
+
+    async def _delay(self, endpoint):
+        self.requests[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    # Mimic Helix's points bucket and its Ratelimit-* headers
+    def _respond(self, payload):
+        now = time.monotonic()
+        refill_rate = self.rate_limit / 60
+        self.points = min(self.rate_limit, self.points + (now - self.points_updated_at) * refill_rate)
+        self.points_updated_at = now
+        status = 200
+        reset = time.time() + (self.rate_limit - self.points) / refill_rate
+        if self.points < 1 or (self.throttle_rate and self.rng.random() < self.throttle_rate):
+            status = 429
+            self.requests['429'] += 1
+            payload = {'error': 'Too Many Requests', 'status': 429, 'message': ''}
+            if self.points >= 1:
+                reset = time.time() + 1  # Injected, as if another client on the same token had drained the bucket
+        elif self.error_rate and self.rng.random() < self.error_rate:
+            status = 500
+            self.requests['500'] += 1
+            payload = {'error': 'Internal Server Error', 'status': 500, 'message': ''}
+        else:
+            self.points -= 1
+        headers = {
+            'Ratelimit-Limit': str(self.rate_limit),
+            'Ratelimit-Remaining': str(int(self.points)),
+            'Ratelimit-Reset': str(int(reset))
+        }
+        return web.json_response(payload, status=status, headers=headers)
+
+    async def token(self, request):
+        return web.json_response({'access_token': 'fake', 'expires_in': 3600, 'token_type': 'bearer'})
+
+    async def get_users(self, request):
+        await self._delay('users')
+        data = []
+        for login in request.query.getall('login', []):
+            user_id = self.users.get(login.lower())
+            if user_id:
+                data.append({
+                    'id': user_id, 'login': login.lower(), 'display_name': login, 'type': '',
+                    'broadcaster_type': '', 'description': '', 'profile_image_url': '',
+                    'offline_image_url': '', 'view_count': 0, 'created_at': '2020-01-01T00:00:00Z'
+                })
+        return self._respond({'data': data})
+
+    async def get_streams(self, request):
+        await self._delay('streams')
+        data = [self.streams[user_id] for user_id in request.query.getall('user_id', []) if user_id in self.streams]
+        return self._respond({'data': data, 'pagination': {}})
+
+    async def get_games(self, request):
+        await self._delay('games')
+        data = [
+            {'id': game_id, 'name': self.games[game_id], 'box_art_url': '', 'igdb_id': ''}
+            for game_id in request.query.getall('id', []) if game_id in self.games
+        ]
+        return self._respond({'data': data, 'pagination': {}})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/oauth2/token', self.token)
+        app.router.add_get('/helix/users', self.get_users)
+        app.router.add_get('/helix/streams', self.get_streams)
+        app.router.add_get('/helix/games', self.get_games)
+        return app
+
+
+# The pre-batching behaviour: get_users + get_streams + get_games per streamer
+async def legacy_sweep(twitch, usernames):
+    results = {}
+    for username in usernames:
+        results[username] = {'is_live': False}
+        async for user in twitch.get_users(logins=[username]):
+            async for stream in twitch.get_streams(user_id=[user.id]):
+                game_name = "Unknown Game"
+                if stream.game_id:
+                    async for game in twitch.get_games(game_ids=[stream.game_id]):
+                        game_name = game.name
+                results[username] = {'is_live': True, 'game': game_name}
+    return results
+
+
+async def run_case(roster_size, latency, concurrency, port):
+    fake = FakeHelix(roster_size, latency=latency)
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', port)
+    await site.start()
+    try:
+        twitch = await HelixClient(
+            'bench', 'bench',
+            rate_limiter=TokenBucket(),
+            base_url=f"http://127.0.0.1:{port}/helix/",
+            auth_base_url=f"http://127.0.0.1:{port}/oauth2/"
+        )
+        # Two sweeps through the same in-memory caches: the first fills them, the second runs warm
+        user_cache = TTLCache("user_ids", 3600)
+        game_cache = TTLCache("game_names", 3600)
+
+        async def cached_sweep(twitch, usernames):
+            return await fetch_live_statuses(twitch, usernames, user_cache, game_cache, concurrency)
+
+        # The per-streamer sweep again, on one pooled keep-alive session instead of a session per call
+        transport = HelixTransport(limit_per_host=concurrency)
+
+        rows = []
+        sweeps = (
+            ("legacy", legacy_sweep, None),
+            ("pooled", legacy_sweep, transport),
+            ("batched", fetch_live_statuses, None),
+            ("cold", cached_sweep, None),
+            ("warm", cached_sweep, None)
+        )
+        for name, sweep, sweep_transport in sweeps:
+            # Every mode starts with a full rate limit bucket on both sides
+            fake.requests.clear()
+            fake.points = float(fake.rate_limit)
+            twitch.rate_limiter = TokenBucket()
+            twitch.transport = sweep_transport
+            start = time.perf_counter()
+            results = await sweep(twitch, fake.logins)
+            elapsed = time.perf_counter() - start
+            live = sum(1 for info in results.values() if info['is_live'])
+            rows.append((name, roster_size, sum(fake.requests.values()), dict(fake.requests), live, elapsed))
+        print(f"pooled session for {roster_size} streamers: {transport.stats()}")
+        await transport.close()
+        return rows
+    finally:
+        await runner.cleanup()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the batched Helix poller against a fake Helix server")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 500, 1000])
+    parser.add_argument('--latency', type=float, default=0.02, help="Simulated per-request latency in seconds")
+    parser.add_argument('--concurrency', type=int, default=4, help="Helix requests in flight at once")
+    parser.add_argument('--port', type=int, default=8781)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'roster':>7} {'requests':>9} {'live':>5} {'sweep_s':>9}  breakdown")
+    for size in args.sizes:
+        for name, roster_size, total, breakdown, live, elapsed in await run_case(size, args.latency, args.concurrency, args.port):
+            print(f"{name:<8} {roster_size:>7} {total:>9} {live:>5} {elapsed:>9.3f}  {breakdown}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+import hashlib
+import json
+import logging
+import os
+
+
+# Hash of the command payloads the tree would upload for a guild, so a sync can be skipped when nothing changed
+def command_tree_hash(tree, guild):
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda command: (command.get('type', 1), command['name'])
+    )
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def load_hashes(path):
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_hashes(path, hashes):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as file:
+        json.dump(hashes, file)
+    os.replace(temp_path, path)
+
+
+# Sync the guild's commands only if they differ from the last successful sync recorded in path.
+# Returns the number of synced commands, or None when the sync was skipped.
+async def sync_commands_if_changed(tree, guild, application_id, path):
+    key = f"{application_id}:{guild.id}"
+    tree_hash = command_tree_hash(tree, guild)
+    hashes = load_hashes(path)
+    if hashes.get(key) == tree_hash:
+        logging.info(f"Commands for guild {guild.id} unchanged, skipping sync.")
+        return None
+    synced = await tree.sync(guild=guild)
+    hashes[key] = tree_hash
+    try:
+        save_hashes(path, hashes)
+    except OSError as e:
+        logging.error(f"Error saving command tree hash to {path}: {e}")
+    return len(synced)
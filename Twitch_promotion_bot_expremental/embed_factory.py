@@ -0,0 +1,46 @@
+import discord
+
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_HEIGHT = 180
+
+
+# Builds live announcement embeds. The per-streamer static parts (URL, description, colour) are
+# precompiled once into a dict template; each build only fills in title, game, viewers and thumbnail.
+class EmbedFactory:
+    def __init__(self, color=None):
+        self.color = (color or discord.Color.purple()).value
+        self.templates = {}  # username -> static embed dict
+        self.thumbnails = {}  # Twitch thumbnail template -> URL formatted to the announcement size
+
+    def template(self, username):
+        template = self.templates.get(username)
+        if template is None:
+            template = self.templates[username] = {
+                'type': 'rich',
+                'description': f"{username} is now live on Twitch!",
+                'color': self.color,
+                'url': f"https://twitch.tv/{username}"
+            }
+        return template
+
+    # Twitch thumbnail URLs are per-channel templates with {width}/{height} placeholders
+    def thumbnail(self, thumbnail_template):
+        url = self.thumbnails.get(thumbnail_template)
+        if url is None:
+            url = self.thumbnails[thumbnail_template] = thumbnail_template.format(width=THUMBNAIL_WIDTH, height=THUMBNAIL_HEIGHT)
+        return url
+
+    def build(self, username, stream_info):
+        data = dict(self.template(username))
+        data['title'] = stream_info['title']
+        data['fields'] = [
+            {'name': "Game", 'value': str(stream_info['game']), 'inline': True},
+            {'name': "Viewers", 'value': str(stream_info['viewers']), 'inline': True}
+        ]
+        if stream_info['thumbnail']:
+            data['thumbnail'] = {'url': self.thumbnail(stream_info['thumbnail'])}
+        return discord.Embed.from_dict(data)
+
+    # Drop the cached template when a streamer leaves the roster
+    def forget(self, username):
+        self.templates.pop(username, None)
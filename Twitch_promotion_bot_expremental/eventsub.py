@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+from helix_poller import run_bounded
+
+EVENTSUB_SUBSCRIPTION_TYPES = ("stream.online", "stream.offline")
+EVENTSUB_MESSAGE_MAX_AGE = 600  # Twitch recommends rejecting messages older than 10 minutes
+
+
+# Signature Twitch sends in the Twitch-Eventsub-Message-Signature header
+def sign_message(secret, message_id, timestamp, body):
+    message = message_id.encode() + timestamp.encode() + body
+    return "sha256=" + hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+# Local aiohttp webhook receiver for EventSub notifications
+class EventSubReceiver:
+    def __init__(self, secret, on_event, host="0.0.0.0", port=8080, path="/eventsub", on_status=None):
+        self.secret = secret
+        self.on_event = on_event  # async callback(subscription_type, event)
+        self.on_status = on_status  # callback(subscription_type, broadcaster_user_id, enabled) on verification and revocation
+        self.host = host
+        self.port = port
+        self.path = path
+        self.seen_message_ids = OrderedDict()  # message id -> time received, oldest first
+        self.pending = set()  # Dispatch tasks still running, kept so they are not garbage collected
+        self.runner = None
+
+    # Twitch may deliver the same message more than once, remember ids for as long as they are valid
+    def is_duplicate(self, message_id, now):
+        while self.seen_message_ids:
+            oldest_id, received_at = next(iter(self.seen_message_ids.items()))
+            if now - received_at <= EVENTSUB_MESSAGE_MAX_AGE:
+                break
+            self.seen_message_ids.pop(oldest_id)
+        if message_id in self.seen_message_ids:
+            return True
+        self.seen_message_ids[message_id] = now
+        return False
+
+    async def handle(self, request):
+        body = await request.read()
+        message_id = request.headers.get('Twitch-Eventsub-Message-Id')
+        timestamp = request.headers.get('Twitch-Eventsub-Message-Timestamp')
+        signature = request.headers.get('Twitch-Eventsub-Message-Signature')
+        message_type = request.headers.get('Twitch-Eventsub-Message-Type')
+        if not (message_id and timestamp and signature and message_type):
+            return web.Response(status=400)
+
+        if not hmac.compare_digest(sign_message(self.secret, message_id, timestamp, body), signature):
+            logging.warning(f"Rejected EventSub message {message_id} with an invalid signature")
+            return web.Response(status=403)
+
+        now = datetime.now(timezone.utc)
+        try:
+            sent_at = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        except ValueError:
+            return web.Response(status=400)
+        if (now - sent_at).total_seconds() > EVENTSUB_MESSAGE_MAX_AGE:
+            logging.warning(f"Rejected stale EventSub message {message_id} sent at {timestamp}")
+            return web.Response(status=403)
+
+        # A redelivered verification still needs the challenge echoed back, or the subscription never becomes enabled
+        if message_type != 'webhook_callback_verification' and self.is_duplicate(message_id, now.timestamp()):
+            return web.Response(status=204)
+
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return web.Response(status=400)
+        subscription = payload.get('subscription', {})
+
+        if message_type == 'webhook_callback_verification':
+            logging.info(f"Verified EventSub subscription {subscription.get('type')} {subscription.get('id')}")
+            self.report_status(subscription, True)
+            return web.Response(text=payload.get('challenge', ''), content_type='text/plain')
+
+        if message_type == 'revocation':
+            logging.warning(f"EventSub subscription {subscription.get('type')} {subscription.get('id')} revoked: {subscription.get('status')}")
+            self.report_status(subscription, False)
+            return web.Response(status=204)
+
+        if message_type == 'notification':
+            # Acknowledge right away, Twitch retries deliveries that take too long to answer
+            task = asyncio.create_task(self.dispatch(subscription.get('type'), payload.get('event', {})))
+            self.pending.add(task)
+            task.add_done_callback(self.pending.discard)
+        return web.Response(status=204)
+
+    def report_status(self, subscription, enabled):
+        if self.on_status is None:
+            return
+        try:
+            self.on_status(subscription.get('type'), subscription.get('condition', {}).get('broadcaster_user_id'), enabled)
+        except Exception as e:
+            logging.error(f"Error handling EventSub subscription status: {e}")
+
+    async def dispatch(self, subscription_type, event):
+        try:
+            await self.on_event(subscription_type, event)
+        except Exception as e:
+            logging.error(f"Error handling EventSub {subscription_type} event: {e}")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logging.info(f"EventSub receiver listening on {self.host}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+# Make the webhook subscriptions match the roster: {user_id: login} -> one online and one offline subscription each.
+# Returns {(type, user_id): enabled} for the subscriptions Twitch listed; the ones it creates are not enabled until
+# Twitch verifies the callback (EventSubReceiver's on_status).
+async def sync_subscriptions(twitch, user_ids, callback_url, secret, max_concurrency=4):
+    existing = {}  # (type, user_id) -> subscription id
+    stale = []
+    statuses = {}
+    result = await twitch.get_eventsub_subscriptions()
+    async for subscription in result:
+        if subscription.transport.get('callback') != callback_url or subscription.type not in EVENTSUB_SUBSCRIPTION_TYPES:
+            continue
+        user_id = subscription.condition.get('broadcaster_user_id')
+        if user_id not in user_ids or subscription.status not in ('enabled', 'webhook_callback_verification_pending'):
+            stale.append(subscription.id)
+            statuses.setdefault((subscription.type, user_id), False)  # A duplicate may still be enabled
+        else:
+            existing[(subscription.type, user_id)] = subscription.id
+            statuses[(subscription.type, user_id)] = subscription.status == 'enabled'
+
+    transport = {'method': 'webhook', 'callback': callback_url, 'secret': secret}
+    missing = [
+        (subscription_type, user_id)
+        for user_id in user_ids
+        for subscription_type in EVENTSUB_SUBSCRIPTION_TYPES
+        if (subscription_type, user_id) not in existing
+    ]
+
+    async def create(subscription_type, user_id):
+        try:
+            await twitch.create_eventsub_subscription(subscription_type, '1', {'broadcaster_user_id': user_id}, transport)
+        except Exception as e:
+            logging.error(f"Error subscribing to {subscription_type} for {user_ids[user_id]}: {e}")
+
+    async def delete(subscription_id):
+        try:
+            await twitch.delete_eventsub_subscription(subscription_id)
+        except Exception as e:
+            logging.error(f"Error deleting EventSub subscription {subscription_id}: {e}")
+
+    await run_bounded([delete(subscription_id) for subscription_id in stale], max_concurrency)
+    await run_bounded([create(subscription_type, user_id) for subscription_type, user_id in missing], max_concurrency)
+    logging.info(f"EventSub subscriptions synced: {len(missing)} created, {len(stale)} removed, {len(existing)} kept")
+    return statuses
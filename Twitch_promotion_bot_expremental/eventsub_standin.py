@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import aiohttp
+
+from eventsub import EventSubReceiver, sign_message
+
+# Local stand-in for Twitch's EventSub delivery: posts signed webhook messages to a receiver.
+# Without --url it starts its own EventSubReceiver and prints the events it dispatches.
+# Usage: python eventsub_standin.py --secret s3cret --login somestreamer [--url http://127.0.0.1:8080/eventsub]
+
+
+def build_message(message_type, subscription_type, login, event=None, challenge=None):
+    subscription = {
+        'id': str(uuid.uuid4()),
+        'status': 'enabled' if message_type != 'revocation' else 'authorization_revoked',
+        'type': subscription_type,
+        'version': '1',
+        'condition': {'broadcaster_user_id': '1337'},
+        'transport': {'method': 'webhook', 'callback': 'https://example.invalid/eventsub'},
+        'created_at': datetime.now(timezone.utc).isoformat()
+    }
+    payload = {'subscription': subscription}
+    if challenge is not None:
+        payload['challenge'] = challenge
+    if event is not None:
+        payload['event'] = event
+    return payload
+
+
+def stream_event(subscription_type, login):
+    event = {'broadcaster_user_id': '1337', 'broadcaster_user_login': login, 'broadcaster_user_name': login}
+    if subscription_type == 'stream.online':
+        event.update({'id': '9001', 'type': 'live', 'started_at': datetime.now(timezone.utc).isoformat()})
+    return event
+
+
+async def post(session, url, secret, message_type, payload, message_id=None, timestamp=None, signature=None):
+    body = json.dumps(payload).encode()
+    message_id = message_id or str(uuid.uuid4())
+    timestamp = timestamp or datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+    headers = {
+        'Content-Type': 'application/json',
+        'Twitch-Eventsub-Message-Id': message_id,
+        'Twitch-Eventsub-Message-Timestamp': timestamp,
+        'Twitch-Eventsub-Message-Type': message_type,
+        'Twitch-Eventsub-Message-Signature': signature or sign_message(secret, message_id, timestamp, body),
+        'Twitch-Eventsub-Subscription-Type': payload['subscription']['type']
+    }
+    async with session.post(url, data=body, headers=headers) as response:
+        return response.status, await response.text()
+
+
+# Send every kind of message the receiver has to cope with and check the status codes it answers with
+async def run_scenario(url, secret, login):
+    checks = []
+    async with aiohttp.ClientSession() as session:
+        payload = build_message('webhook_callback_verification', 'stream.online', login, challenge='pogchamp-kappa-360noscope')
+        status, text = await post(session, url, secret, 'webhook_callback_verification', payload)
+        checks.append(("verification challenge echoed", status == 200 and text == 'pogchamp-kappa-360noscope'))
+
+        online = build_message('notification', 'stream.online', login, event=stream_event('stream.online', login))
+        message_id = str(uuid.uuid4())
+        status, _ = await post(session, url, secret, 'notification', online, message_id=message_id)
+        checks.append(("stream.online accepted", status == 204))
+        status, _ = await post(session, url, secret, 'notification', online, message_id=message_id)
+        checks.append(("duplicate delivery acknowledged", status == 204))
+
+        status, _ = await post(session, url, secret, 'notification', online, signature='sha256=' + '0' * 64)
+        checks.append(("bad signature rejected", status == 403))
+
+        stale = (datetime.now(timezone.utc) - timedelta(minutes=15)).isoformat().replace('+00:00', 'Z')
+        status, _ = await post(session, url, secret, 'notification', online, timestamp=stale)
+        checks.append(("stale message rejected", status == 403))
+
+        offline = build_message('notification', 'stream.offline', login, event=stream_event('stream.offline', login))
+        status, _ = await post(session, url, secret, 'notification', offline)
+        checks.append(("stream.offline accepted", status == 204))
+
+        revocation = build_message('revocation', 'stream.online', login)
+        status, _ = await post(session, url, secret, 'revocation', revocation)
+        checks.append(("revocation acknowledged", status == 204))
+    return checks
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Post signed EventSub payloads to a webhook receiver")
+    parser.add_argument('--url', help="Receiver to target, defaults to a local receiver started by this script")
+    parser.add_argument('--secret', default='standin-secret')
+    parser.add_argument('--login', default='somestreamer')
+    parser.add_argument('--port', type=int, default=8782)
+    args = parser.parse_args()
+
+    receiver = None
+    dispatched = []
+    url = args.url
+    if url is None:
+        async def on_event(subscription_type, event):
+            dispatched.append(subscription_type)
+            print(f"dispatched {subscription_type} for {event.get('broadcaster_user_login')}")
+
+        receiver = EventSubReceiver(args.secret, on_event, '127.0.0.1', args.port)
+        await receiver.start()
+        url = f"http://127.0.0.1:{args.port}/eventsub"
+
+    try:
+        checks = await run_scenario(url, args.secret, args.login)
+        await asyncio.sleep(0.1)  # Let the receiver finish dispatching
+        if receiver is not None:
+            checks.append(("each event dispatched exactly once", dispatched == ['stream.online', 'stream.offline']))
+    finally:
+        if receiver is not None:
+            await receiver.stop()
+
+    for name, passed in checks:
+        print(f"{'PASS' if passed else 'FAIL'}  {name}")
+    if not all(passed for _, passed in checks):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
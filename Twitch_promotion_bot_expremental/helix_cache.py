@@ -0,0 +1,104 @@
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+
+
+# In-memory LRU cache with per-entry TTL, written through to a SQLite table so a restart starts warm
+class TTLCache:
+    def __init__(self, name, ttl, max_entries=10000, store_path=None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (value, expires_at), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        if store_path:
+            self._open_store(store_path)
+
+    def _open_store(self, store_path):
+        try:
+            self.db = sqlite3.connect(store_path)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            now = time.time()
+            self.db.execute(f"DELETE FROM {self.name} WHERE expires_at < ?", (now,))
+            self.db.commit()
+            rows = self.db.execute(
+                f"SELECT key, value, expires_at FROM {self.name} ORDER BY expires_at DESC LIMIT ?",
+                (self.max_entries,)
+            ).fetchall()
+            for key, value, expires_at in reversed(rows):
+                self.entries[key] = (value, expires_at)
+            logging.info(f"Loaded {len(self.entries)} cached entries for {self.name}")
+        except sqlite3.Error as e:
+            logging.error(f"Error opening cache store {store_path} for {self.name}: {e}")
+            self.db = None
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at < time.time():
+            self.invalidate(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.set_many([(key, value)])
+
+    # Store several entries with a single write to disk
+    def set_many(self, items):
+        expires_at = time.time() + self.ttl
+        rows = []
+        for key, value in items:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            rows.append((key, value, expires_at))
+        evicted = []
+        while len(self.entries) > self.max_entries:
+            key, _ = self.entries.popitem(last=False)
+            evicted.append((key,))
+        if self.db is not None and (rows or evicted):
+            try:
+                self.db.executemany(f"INSERT OR REPLACE INTO {self.name} (key, value, expires_at) VALUES (?, ?, ?)", rows)
+                self.db.executemany(f"DELETE FROM {self.name} WHERE key = ?", evicted)
+                self.db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Error writing cache store for {self.name}: {e}")
+
+    # Change the entry limit, evicting the least recently used entries if it shrinks
+    def resize(self, max_entries):
+        if max_entries != self.max_entries:
+            self.max_entries = max_entries
+            self.set_many([])
+
+    def invalidate(self, key):
+        self.entries.pop(key, None)
+        if self.db is not None:
+            try:
+                self.db.execute(f"DELETE FROM {self.name} WHERE key = ?", (key,))
+                self.db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Error writing cache store for {self.name}: {e}")
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return f"{self.name}: {len(self.entries)} entries, {self.hits} hits, {self.misses} misses ({self.hit_rate():.0%} hit rate)"
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -0,0 +1,49 @@
+import time
+from urllib.parse import urlsplit
+
+from twitchAPI.twitch import Twitch
+from twitchAPI.type import TwitchAPIException
+
+RATE_LIMIT_RETRIES = 3  # Times a request answered with 429 is sent again once the bucket has reset
+
+
+# Twitch client that sends every Helix request through a shared token bucket.
+# on_request(endpoint, status, seconds) is called after each response, e.g. to record metrics.
+# With a transport, requests go out on its pooled session instead of the one twitchAPI opens per call.
+class HelixClient(Twitch):
+    def __init__(self, app_id, app_secret=None, rate_limiter=None, on_request=None, transport=None, **kwargs):
+        super().__init__(app_id, app_secret, **kwargs)
+        self.rate_limiter = rate_limiter
+        self.on_request = on_request
+        self.transport = transport
+
+    async def _api_request(self, method, session, url, auth_type, required_scope, data=None, retries=1):
+        if self.transport is not None:
+            session = self.transport.session
+        rate_limit_retries = RATE_LIMIT_RETRIES if self.rate_limiter is not None else 0
+        while True:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire()
+            headers = self._generate_header(auth_type, required_scope)
+            self.logger.debug(f'making {method} request to {url}')
+            started = time.monotonic()
+            response = await session.request(method, url, headers=headers, json=data)
+            if self.on_request is not None:
+                self.on_request(helix_endpoint(url), response.status, time.monotonic() - started)
+            if self.rate_limiter is not None:
+                self.rate_limiter.update_from_headers(response.status, response.headers)
+            if response.status != 429:
+                break
+            # twitchAPI would wait for the reset and then hand back the empty 429 body as if it were a result,
+            # which reads as every streamer in the batch being offline. Wait in the bucket and send it again instead.
+            response.release()
+            if rate_limit_retries == 0:
+                raise TwitchAPIException('Rate limit exceeded')
+            rate_limit_retries -= 1
+        return await self._check_request_return(session, response, method, url, auth_type, required_scope, data, retries)
+
+
+# "streams" for https://api.twitch.tv/helix/streams?user_id=1, so metrics are labelled by endpoint rather than by URL
+def helix_endpoint(url):
+    path = urlsplit(url).path
+    return path.split("/helix/", 1)[-1].strip("/") or path
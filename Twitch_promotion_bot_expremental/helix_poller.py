@@ -0,0 +1,178 @@
+import asyncio
+import logging
+
+# Helix accepts up to 100 logins / user ids / game ids per request
+HELIX_BATCH_SIZE = 100
+
+# Default number of Helix requests a sweep keeps in flight at once
+HELIX_CONCURRENCY = 4
+
+
+# Split a list into chunks that fit into a single Helix request
+def chunked(items, size=HELIX_BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# Run the jobs with at most max_concurrency of them awaiting at the same time
+async def run_bounded(jobs, max_concurrency):
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(job):
+        async with semaphore:
+            return await job
+
+    return await asyncio.gather(*(run(job) for job in jobs))
+
+
+# Resolve logins to user ids, 100 logins per get_users call
+async def resolve_user_ids(twitch, logins, errors, max_concurrency=HELIX_CONCURRENCY):
+    user_ids = {}  # user_id -> lowercase login
+
+    async def resolve_chunk(chunk):
+        try:
+            async for user in twitch.get_users(logins=chunk):
+                user_ids[user.id] = user.login.lower()
+        except Exception as e:
+            logging.error(f"Error resolving Twitch users {chunk}: {e}")
+            for login in chunk:
+                errors[login] = str(e)
+
+    await run_bounded([resolve_chunk(chunk) for chunk in chunked(logins)], max_concurrency)
+    return user_ids
+
+
+# Fetch live streams for the given user ids, 100 ids per get_streams call. Unknown or stale ids are not an error,
+# Helix just leaves them out of the list.
+async def fetch_streams(twitch, user_ids, errors, max_concurrency=HELIX_CONCURRENCY):
+    streams = []
+
+    async def fetch_chunk(chunk):
+        try:
+            async for stream in twitch.get_streams(user_id=chunk, first=HELIX_BATCH_SIZE):
+                streams.append(stream)
+        except Exception as e:
+            logging.error(f"Error fetching Twitch streams: {e}")
+            for user_id in chunk:
+                errors[user_ids[user_id]] = str(e)
+
+    await run_bounded([fetch_chunk(chunk) for chunk in chunked(list(user_ids))], max_concurrency)
+    return streams
+
+
+# Resolve game names for every game id seen in the sweep with as few get_games calls as possible
+async def resolve_game_names(twitch, game_ids, max_concurrency=HELIX_CONCURRENCY):
+    game_names = {}
+
+    async def resolve_chunk(chunk):
+        try:
+            async for game in twitch.get_games(game_ids=chunk):
+                game_names[game.id] = game.name
+        except Exception as e:
+            logging.error(f"Error resolving Twitch games {chunk}: {e}")
+
+    await run_bounded([resolve_chunk(chunk) for chunk in chunked(game_ids)], max_concurrency)
+    return game_names
+
+
+# Build the stream_info dict the rest of the bot works with
+def build_stream_info(stream, game_name):
+    return {
+        'is_live': True,
+        'user_id': stream.user_id,
+        'title': stream.title,
+        'game': game_name,
+        'viewers': stream.viewer_count,
+        'thumbnail': stream.thumbnail_url,
+        'started_at': stream.started_at
+    }
+
+
+# Look up every login in the roster's stored ids, then the cache, and return ({user_id: login}, [logins still to resolve])
+def cached_user_ids(logins, user_cache, roster=None):
+    user_ids = {}
+    unresolved = []
+    for login in logins:
+        user_id = roster.user_id(login) if roster is not None else None
+        if user_id is None and user_cache is not None:
+            user_id = user_cache.get(login)
+        if user_id is None:
+            unresolved.append(login)
+        else:
+            user_ids[user_id] = login
+    return user_ids, unresolved
+
+
+# Resolve lowercase logins to {user_id: login}, only logins missing from the roster and the cache cost a get_users
+# call. Resolved ids are stored in the roster for good, so a streamer who renames keeps being found by id.
+async def lookup_user_ids(twitch, logins, errors, user_cache=None, max_concurrency=HELIX_CONCURRENCY, roster=None):
+    user_ids, unresolved = cached_user_ids(logins, user_cache, roster)
+    if unresolved:
+        resolved = await resolve_user_ids(twitch, unresolved, errors, max_concurrency)
+        if user_cache is not None:
+            user_cache.set_many((login, user_id) for user_id, login in resolved.items())
+        if roster is not None:
+            roster.set_user_ids((login, user_id) for user_id, login in resolved.items())
+        user_ids.update(resolved)
+    return user_ids
+
+
+# Check a whole roster in one sweep and return {username: stream_info}
+async def fetch_live_statuses(twitch, usernames, user_cache=None, game_cache=None, max_concurrency=HELIX_CONCURRENCY,
+                              roster=None):
+    usernames = [username for username in usernames if username]
+    logins = list(dict.fromkeys(username.lower() for username in usernames))
+    errors = {}
+
+    user_ids = await lookup_user_ids(twitch, logins, errors, user_cache, max_concurrency, roster)
+    live_streams = await fetch_streams(twitch, user_ids, errors, max_concurrency)
+
+    # A stream whose login no longer matches the roster one means the account was renamed. The user id is still the
+    # streamer the roster means, so the stream counts for the roster login, which keeps resolving through the id the
+    # roster stored. Warn once per cache lifetime so the roster login can be updated by hand.
+    for stream in live_streams:
+        login = user_ids.get(stream.user_id)
+        if login is None or not stream.user_login or stream.user_login.lower() == login:
+            continue
+        if user_cache is None or user_cache.get(stream.user_login.lower()) != stream.user_id:
+            logging.warning(
+                f"Twitch user {login} was renamed to {stream.user_login}, it is still tracked by user id; "
+                f"re-add it under the new name to update the roster"
+            )
+            if user_cache is not None:
+                user_cache.set_many([(login, stream.user_id), (stream.user_login.lower(), stream.user_id)])
+
+    # Helix already returns game_name with each stream, only look up the ones it left blank
+    game_names = {stream.game_id: stream.game_name for stream in live_streams if stream.game_id and stream.game_name}
+    if game_cache is not None:
+        # Only new or renamed games cost a write, the same games show up on every sweep
+        changed = [(game_id, name) for game_id, name in game_names.items() if game_cache.get(game_id) != name]
+        if changed:
+            game_cache.set_many(changed)
+    missing_game_ids = []
+    for game_id in {stream.game_id for stream in live_streams if stream.game_id and stream.game_id not in game_names}:
+        game_name = game_cache.get(game_id) if game_cache is not None else None
+        if game_name is None:
+            missing_game_ids.append(game_id)
+        else:
+            game_names[game_id] = game_name
+    if missing_game_ids:
+        resolved_games = await resolve_game_names(twitch, missing_game_ids, max_concurrency)
+        if game_cache is not None:
+            game_cache.set_many(resolved_games.items())
+        game_names.update(resolved_games)
+
+    statuses = {}
+    for stream in live_streams:
+        login = user_ids.get(stream.user_id)
+        if login is not None:
+            statuses[login] = build_stream_info(stream, game_names.get(stream.game_id, "Unknown Game"))
+
+    results = {}
+    for username in usernames:
+        login = username.lower()
+        if login in errors:
+            results[username] = {'is_live': False, 'error': errors[login]}
+        else:
+            results[username] = statuses.get(login, {'is_live': False})
+    return results
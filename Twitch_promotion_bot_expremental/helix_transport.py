@@ -0,0 +1,62 @@
+import logging
+
+import aiohttp
+
+
+# One long-lived pooled aiohttp session for all Twitch traffic (sweeps, manual checks, EventSub management).
+# Connections are kept alive between sweeps and DNS answers are cached, and a trace hook counts how many
+# requests reused a pooled connection. The session is created on first use so it binds to the running loop.
+class HelixTransport:
+    def __init__(self, limit=100, limit_per_host=10, keepalive_timeout=60, dns_cache_ttl=300, timeout=30):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session = None
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+
+    @property
+    def session(self):
+        if self._session is None or self._session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_request_start.append(self._on_request_start)
+            trace.on_connection_create_end.append(self._on_connection_create_end)
+            trace.on_connection_reuseconn.append(self._on_connection_reuseconn)
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, trace_configs=[trace])
+        return self._session
+
+    async def _on_request_start(self, session, context, params):
+        self.requests += 1
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.connections_created += 1
+
+    async def _on_connection_reuseconn(self, session, context, params):
+        self.connections_reused += 1
+
+    # Share of requests that went out on an already open connection
+    def reuse_rate(self):
+        connections = self.connections_created + self.connections_reused
+        return self.connections_reused / connections if connections else 0.0
+
+    def stats(self):
+        return (
+            f"{self.requests} requests, {self.connections_created} connections opened, "
+            f"{self.connections_reused} reused ({self.reuse_rate():.1%} reuse)"
+        )
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logging.info(f"Closed Twitch HTTP session: {self.stats()}")
+        self._session = None
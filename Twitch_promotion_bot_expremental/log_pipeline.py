@@ -0,0 +1,194 @@
+import atexit
+import glob
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import date, datetime
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+# One JSON object per line, for grepping and aggregating logs with standard tools
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+# File handler that rolls bot_logs.txt over to bot_logs_<date>.txt at midnight or once it reaches max_bytes.
+# Rolled-over files are remembered until the log upload reports them uploaded.
+class RotatingLogHandler(logging.handlers.BaseRotatingHandler):
+    def __init__(self, filename, max_bytes=0, encoding='utf-8'):
+        super().__init__(filename, 'a', encoding=encoding)
+        self.max_bytes = max_bytes
+        self.current_date = date.today()
+        self.rotated_files = []  # Rotated and not uploaded yet, oldest first
+
+    def shouldRollover(self, record):
+        if date.today() != self.current_date:
+            return True
+        if self.max_bytes and self.stream is not None:
+            return self.stream.tell() + len(self.format(record)) + 1 >= self.max_bytes
+        return False
+
+    def rotated_name(self):
+        root, ext = os.path.splitext(self.baseFilename)
+        name = f"{root}_{self.current_date:%Y-%m-%d}{ext}"
+        counter = 1
+        while os.path.exists(name):
+            name = f"{root}_{self.current_date:%Y-%m-%d}_{counter}{ext}"
+            counter += 1
+        return name
+
+    def doRollover(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            name = self.rotated_name()
+            os.replace(self.baseFilename, name)
+            self.rotated_files.append(name)
+        self.current_date = date.today()
+        self.stream = self._open()
+
+    # Roll over now (called from the event loop while the listener thread may be writing) and
+    # return every rotated file that has not been uploaded yet
+    def rotate(self):
+        self.acquire()
+        try:
+            self.doRollover()
+            self.rotated_files = [name for name in self.rotated_files if os.path.exists(name)]
+            return list(self.rotated_files)
+        finally:
+            self.release()
+
+    def mark_uploaded(self, name):
+        self.acquire()
+        try:
+            if name in self.rotated_files:
+                self.rotated_files.remove(name)
+        finally:
+            self.release()
+
+    def pending_files(self):
+        self.acquire()
+        try:
+            return list(self.rotated_files)
+        finally:
+            self.release()
+
+
+# QueueListener whose stop() can be called more than once (when the bot shuts down and again from atexit, which still
+# covers modules that import the bot without running it)
+class LogListener(logging.handlers.QueueListener):
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+# Route all logging through a queue so the event loop never waits on disk I/O; a background
+# listener thread does the formatting and writing
+def setup_logging(filename, max_bytes=0, json_lines=False, level=logging.INFO):
+    file_handler = RotatingLogHandler(filename, max_bytes)
+    file_handler.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(LOG_FORMAT))
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    listener = LogListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    return file_handler, listener
+
+
+DISCORD_ATTACHMENT_LIMIT = 10 * 1024 * 1024  # Discord's upload limit for servers without boosts
+COMPRESS_BLOCK_SIZE = 1024 * 1024
+
+
+# Gzip a log file into parts of at most part_bytes each, reading it a block at a time. Every part is a complete
+# gzip member, so each one opens on its own and `cat part1 part2 ... | gunzip` gives back the whole file.
+# Blocking, meant to run in a worker thread. Returns (part paths, original size, compressed size).
+def compress_log(path, part_bytes=DISCORD_ATTACHMENT_LIMIT, level=6):
+    # A block can compress to slightly more than its own size, leave room for one more before the limit
+    headroom = COMPRESS_BLOCK_SIZE + COMPRESS_BLOCK_SIZE // 100 + 1024
+    if part_bytes <= headroom:
+        raise ValueError(f"part_bytes must be larger than {headroom}")
+    parts = []
+    original_size = 0
+    compressed_size = 0
+    raw = None
+    archive = None
+    try:
+        with open(path, "rb") as source:
+            while True:
+                block = source.read(COMPRESS_BLOCK_SIZE)
+                if not block:
+                    break
+                if archive is not None and raw.tell() + headroom > part_bytes:
+                    archive.close()
+                    compressed_size += raw.tell()
+                    raw.close()
+                    archive = None
+                if archive is None:
+                    part_path = f"{path}.{len(parts) + 1:03d}.gz"
+                    raw = open(part_path, "wb")
+                    archive = gzip.GzipFile(os.path.basename(path), "wb", level, raw)
+                    parts.append(part_path)
+                archive.write(block)
+                archive.flush()  # Sync flush so raw.tell() is the real part size
+                original_size += len(block)
+    finally:
+        if archive is not None:
+            archive.close()
+            compressed_size += raw.tell()
+            raw.close()
+    return parts, original_size, compressed_size
+
+
+# Keep the newest max_files rotated logs and remove everything else, including parts left over from a failed upload.
+# The newest max_files of the pending (not yet uploaded) logs are kept as well, even if newer logs push them out.
+# Blocking, meant to run in a worker thread. Returns the removed paths.
+def remove_old_logs(pattern, max_files, pending=()):
+    log_files = sorted(glob.glob(pattern), key=os.path.getmtime)
+    keep = set(log_files[-max_files:] if max_files else [])
+    pending = {os.path.abspath(path) for path in pending}  # The handler's names are absolute, the glob's may not be
+    pending = [path for path in log_files if os.path.abspath(path) in pending]
+    keep.update(pending[-max_files:] if max_files else [])
+    stale = [path for path in log_files if path not in keep]
+    stale += glob.glob(pattern + ".*.gz")
+    return remove_files(stale)
+
+
+def remove_files(paths):
+    removed = []
+    for path in paths:
+        try:
+            os.remove(path)
+            removed.append(path)
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def format_size(size):
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+
+
+# Stack of the given thread as a list of (file, line, function), outermost first
+def thread_stack(thread_id):
+    frame = sys._current_frames().get(thread_id)
+    if frame is None:
+        return []
+    return [(summary.filename, summary.lineno, summary.name) for summary in traceback.extract_stack(frame)]
+
+
+# Measures event loop lag continuously. A coroutine ticks every interval seconds and records how late it woke up;
+# a watcher thread notices when the loop has not ticked for threshold seconds and logs the stack of whatever
+# is blocking it, once per stall.
+class LoopWatchdog:
+    def __init__(self, threshold=0.25, interval=0.1, history_size=600):
+        self.threshold = threshold
+        self.interval = interval
+        self.lags = deque(maxlen=history_size)  # Recent tick lags in seconds
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.last_tick = None
+        self.loop_thread_id = None
+        self.thread = None
+        self.running = False
+
+    async def run(self):
+        self.loop_thread_id = threading.get_ident()
+        self.last_tick = time.monotonic()
+        self.running = True
+        self.thread = threading.Thread(target=self.watch, name="loop-watchdog", daemon=True)
+        self.thread.start()
+        try:
+            while True:
+                started = time.monotonic()
+                await asyncio.sleep(self.interval)
+                self.last_tick = time.monotonic()
+                lag = max(0.0, self.last_tick - started - self.interval)
+                self.lags.append(lag)
+                self.max_lag = max(self.max_lag, lag)
+        finally:
+            self.running = False
+
+    def watch(self):
+        reported_tick = None
+        while self.running:
+            time.sleep(self.interval / 2)
+            tick = self.last_tick
+            blocked_for = time.monotonic() - tick
+            if blocked_for >= self.threshold + self.interval and tick != reported_tick:
+                reported_tick = tick
+                self.stalls += 1
+                stack = "".join(
+                    f'  File "{filename}", line {lineno}, in {name}\n' for filename, lineno, name in thread_stack(self.loop_thread_id)
+                )
+                logging.warning(f"Event loop blocked for {blocked_for:.2f}s, loop thread is at:\n{stack}")
+
+    def recent_max_lag(self):
+        return max(self.lags, default=0.0)
+
+    def stats(self):
+        lags = sorted(self.lags)
+        p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0
+        return f"loop lag p99 {p99 * 1000:.1f}ms, max {self.max_lag * 1000:.1f}ms, {self.stalls} stalls over {self.threshold}s"
+
+
+# Samples the stack of one thread from a background thread and counts identical stacks. The result is written in
+# the collapsed "frame;frame;frame count" format read by flamegraph.pl, speedscope and inferno.
+class SamplingProfiler:
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.thread = None
+        self.started_at = None
+        self.running = False
+
+    def start(self):
+        self.samples.clear()
+        self.running = True
+        self.started_at = time.monotonic()
+        self.thread = threading.Thread(target=self.sample, name="sampling-profiler", daemon=True)
+        self.thread.start()
+
+    def sample(self):
+        while self.running:
+            stack = thread_stack(self.thread_id)
+            if stack:
+                self.samples[";".join(f"{name} ({filename}:{lineno})" for filename, lineno, name in stack)] += 1
+            time.sleep(self.interval)
+
+    # Stop sampling, returns (seconds sampled, number of samples)
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        return time.monotonic() - self.started_at, sum(self.samples.values())
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    # Blocking, meant to run in a worker thread
+    def write(self, path):
+        with open(path, "w") as file:
+            file.write(self.collapsed())
+        return path
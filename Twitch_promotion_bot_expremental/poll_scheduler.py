@@ -0,0 +1,142 @@
+import heapq
+import math
+from collections import deque
+from datetime import datetime, timezone
+
+MINUTES_PER_DAY = 1440
+
+
+# Priority-queue scheduler that keeps a next-check time per streamer.
+# Live streamers and streamers near one of their usual start times are checked often,
+# streamers that keep turning up offline back off exponentially up to max_interval.
+# Streamers whose go-lives are pushed (EventSub) are only reconciled every push_interval seconds.
+class PollScheduler:
+    def __init__(self, base_interval=60, hot_interval=30, max_interval=900, hot_window=1800,
+                 request_budget=120, batch_size=100, history_size=20, push_interval=900):
+        self.base_interval = base_interval
+        self.hot_interval = hot_interval
+        self.max_interval = max_interval
+        self.hot_window = hot_window  # Seconds before and after a usual start time that count as "hot"
+        self.request_budget = request_budget  # Helix requests per minute the sweep may spend
+        self.batch_size = batch_size
+        self.history_size = history_size
+        self.push_interval = push_interval
+        self.heap = []  # (next_check, username), may hold stale entries
+        self.next_check = {}  # username -> next check time, the source of truth for the heap
+        self.offline_streak = {}  # username -> consecutive offline checks
+        self.live = set()
+        self.pushed = set()  # Streamers with working push delivery
+        self.start_minutes = {}  # username -> recent go-live times as UTC minute of the day
+        self.request_times = deque()  # Timestamps of Helix requests made in the last minute
+
+    def schedule(self, username, at):
+        self.next_check[username] = at
+        heapq.heappush(self.heap, (at, username))
+
+    # Add new roster entries (due immediately) and forget removed ones
+    def sync(self, usernames, now):
+        current = {username for username in usernames if username}
+        for username in current - self.next_check.keys():
+            self.schedule(username, now)
+        for username in self.next_check.keys() - current:
+            self.next_check.pop(username)
+            self.offline_streak.pop(username, None)
+            self.live.discard(username)
+            self.pushed.discard(username)
+
+    # Replace the set of streamers with working push delivery. Streamers that lost it are due right away,
+    # a check catches whatever was missed while push delivery was down.
+    def set_pushed(self, usernames, now):
+        lost = self.pushed - usernames
+        self.pushed = set(usernames)
+        for username in lost:
+            if self.next_check.get(username, now) > now:
+                self.schedule(username, now)
+
+    def requests_in_last_minute(self, now):
+        while self.request_times and now - self.request_times[0] >= 60:
+            self.request_times.popleft()
+        return len(self.request_times)
+
+    def record_requests(self, count, now):
+        self.request_times.extend([now] * count)
+
+    # Pop every streamer whose check is due, as many as the remaining request budget covers
+    def due(self, now):
+        remaining_requests = self.request_budget - self.requests_in_last_minute(now)
+        if remaining_requests <= 0:
+            return []
+        limit = remaining_requests * self.batch_size
+        due = []
+        while self.heap and self.heap[0][0] <= now and len(due) < limit:
+            at, username = heapq.heappop(self.heap)
+            if self.next_check.get(username) == at:
+                due.append(username)
+        # Provisional next check so a sweep that dies halfway cannot drop anyone from the queue
+        for username in due:
+            self.schedule(username, now + self.base_interval)
+        return due
+
+    # Seconds until the next usual start time window opens, or None without history
+    def seconds_until_hot(self, username, now):
+        minutes = self.start_minutes.get(username)
+        if not minutes:
+            return None
+        current = datetime.fromtimestamp(now, timezone.utc)
+        current_minute = current.hour * 60 + current.minute + current.second / 60
+        window_minutes = self.hot_window / 60
+        best = None
+        for start_minute in minutes:
+            until_window = (start_minute - window_minutes - current_minute) % MINUTES_PER_DAY
+            # Already inside the window (window opened less than 2 * hot_window ago)
+            if until_window >= MINUTES_PER_DAY - 2 * window_minutes:
+                return 0
+            if best is None or until_window < best:
+                best = until_window
+        return best * 60
+
+    def interval(self, username, now):
+        if username in self.pushed:
+            return self.push_interval
+        if username in self.live:
+            return self.base_interval
+        until_hot = self.seconds_until_hot(username, now)
+        if until_hot == 0:
+            return self.hot_interval
+        backoff = min(self.base_interval * 2 ** self.offline_streak.get(username, 0), self.max_interval)
+        if until_hot is not None:
+            # Never sleep through the start of a usual streaming window
+            backoff = min(backoff, max(self.hot_interval, until_hot))
+        return backoff
+
+    def record_start(self, username, started_at):
+        started_at = started_at.astimezone(timezone.utc) if started_at.tzinfo else started_at.replace(tzinfo=timezone.utc)
+        history = self.start_minutes.setdefault(username, deque(maxlen=self.history_size))
+        history.append(started_at.hour * 60 + started_at.minute)
+
+    # Feed back the result of a check and schedule the next one
+    def record_result(self, username, stream_info, now):
+        if username not in self.next_check:
+            return
+        if stream_info.get('is_live'):
+            if username not in self.live and stream_info.get('started_at'):
+                self.record_start(username, stream_info['started_at'])
+            self.live.add(username)
+            self.offline_streak[username] = 0
+        elif stream_info.get('error'):
+            # Failed checks are retried at the base cadence without counting towards the backoff
+            self.schedule(username, now + self.base_interval)
+            return
+        else:
+            self.live.discard(username)
+            self.offline_streak[username] = self.offline_streak.get(username, 0) + 1
+        self.schedule(username, now + self.interval(username, now))
+
+    # Seconds the sweep loop can sleep before the next streamer is due (or the budget frees up)
+    def seconds_until_next(self, now, cap):
+        while self.heap and self.next_check.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        wait = cap if not self.heap else min(cap, self.heap[0][0] - now)
+        if self.requests_in_last_minute(now) >= self.request_budget:
+            wait = max(wait, 60 - (now - self.request_times[0]))
+        return max(1, math.ceil(wait))
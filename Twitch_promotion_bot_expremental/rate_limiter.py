@@ -0,0 +1,78 @@
+import asyncio
+import contextvars
+import logging
+import time
+
+# Tokens a request must leave in the bucket before it may proceed. The scheduled sweep runs with 0,
+# manual checks set a reserve so they back off before they can starve the sweep.
+request_reserve = contextvars.ContextVar("request_reserve", default=0)
+
+
+# Token bucket mirroring Twitch's Helix rate limit (a bucket of points refilled over one minute)
+class TokenBucket:
+    def __init__(self, capacity=800, refill_period=60):
+        self.capacity = capacity
+        self.refill_period = refill_period
+        self.refill_rate = capacity / refill_period
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.acquired = 0  # Requests let through
+        self.throttled = 0  # Requests that had to wait for a token
+        self.rate_limited = 0  # 429 responses or empty buckets reported by Twitch
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    # Wait until a token is available above the reserve, then take it
+    async def acquire(self, reserve=None):
+        if reserve is None:
+            reserve = request_reserve.get()
+        waited = False
+        while True:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                wait = self.blocked_until - now
+            else:
+                if self.blocked_until:
+                    # Ratelimit-Reset is when Twitch's bucket is full again, not when it starts refilling
+                    self.blocked_until = 0.0
+                    self.tokens = float(self.capacity)
+                    self.updated_at = now
+                self._refill()
+                if self.tokens - 1 >= reserve:
+                    self.tokens -= 1
+                    self.acquired += 1
+                    return
+                wait = (reserve + 1 - self.tokens) / self.refill_rate
+            if not waited:
+                self.throttled += 1
+                waited = True
+            await asyncio.sleep(wait)
+
+    # Resize the bucket from the Ratelimit-* headers Twitch sends with every Helix response
+    def update_from_headers(self, status, headers):
+        try:
+            limit = headers.get('Ratelimit-Limit')
+            if limit is not None and int(limit) != self.capacity:
+                self.capacity = int(limit)
+                self.refill_rate = self.capacity / self.refill_period
+                logging.info(f"Twitch rate limit is {self.capacity} points per {self.refill_period} seconds")
+
+            remaining = headers.get('Ratelimit-Remaining')
+            if remaining is not None:
+                # Other requests may still be in flight, so only ever trust the lower of the two counts
+                self._refill()
+                self.tokens = min(self.tokens, float(remaining))
+
+            if status == 429 or remaining == '0':
+                self.rate_limited += 1
+                self.tokens = 0.0
+                reset = headers.get('Ratelimit-Reset')
+                if reset is not None:
+                    self.blocked_until = time.monotonic() + max(0.0, int(reset) - time.time())
+                logging.warning("Twitch rate limit reached, pausing Helix requests until the bucket resets")
+        except ValueError as e:
+            logging.error(f"Error reading Twitch rate limit headers: {e}")
@@ -0,0 +1,147 @@
+import asyncio
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import time
+
+
+def ring_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+# Consistent hash ring: each member owns the keys that hash between its points and the previous ones,
+# so a member joining or leaving only moves about 1/n of the keys
+class HashRing:
+    def __init__(self, members=(), vnodes=160):
+        self.vnodes = vnodes
+        self.members = tuple(sorted(members))
+        points = sorted((ring_hash(f"{member}#{i}"), member) for member in self.members for i in range(vnodes))
+        self.points = [point for point, _ in points]
+        self.owners = [member for _, member in points]
+
+    def owner(self, key):
+        if not self.points:
+            return None
+        index = bisect.bisect(self.points, ring_hash(key)) % len(self.points)
+        return self.owners[index]
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+# Worker leases and announcement claims in a SQLite file shared by every worker on the host.
+# A worker is part of the ring while its heartbeat is younger than lease_ttl seconds; the live worker with the
+# lowest id is the leader.
+class LeaseCoordinator:
+    def __init__(self, path, worker_id=None, lease_ttl=30, claim_ttl=86400):
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_ttl = lease_ttl
+        self.claim_ttl = claim_ttl
+        self.db = sqlite3.connect(path, timeout=5)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, heartbeat REAL NOT NULL)")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS announcement_claims (key TEXT PRIMARY KEY, worker_id TEXT NOT NULL, claimed_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE TABLE IF NOT EXISTS pushed_streamers (login TEXT PRIMARY KEY, worker_id TEXT NOT NULL)")
+        self.db.commit()
+
+    # Renew this worker's lease, drop expired ones and return the live workers
+    def heartbeat(self):
+        now = time.time()
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO workers (worker_id, heartbeat) VALUES (?, ?)", (self.worker_id, now))
+            self.db.execute("DELETE FROM workers WHERE heartbeat < ?", (now - self.lease_ttl,))
+            self.db.execute("DELETE FROM announcement_claims WHERE claimed_at < ?", (now - self.claim_ttl,))
+        return [worker_id for (worker_id,) in self.db.execute("SELECT worker_id FROM workers ORDER BY worker_id")]
+
+    # True for exactly one worker per key, the first one to claim it
+    def claim(self, key):
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO announcement_claims (key, worker_id, claimed_at) VALUES (?, ?, ?)",
+                (key, self.worker_id, time.time())
+            )
+        return cursor.rowcount == 1
+
+    # Replace the streamers whose go-lives this worker receives through EventSub (only the leader receives them)
+    def set_pushed(self, logins):
+        with self.db:
+            self.db.execute("DELETE FROM pushed_streamers")
+            self.db.executemany(
+                "INSERT OR REPLACE INTO pushed_streamers (login, worker_id) VALUES (?, ?)",
+                ((login.lower(), self.worker_id) for login in logins)
+            )
+
+    # Lowercase logins with push delivery, as published by the given leader (a former leader's list is ignored)
+    def pushed(self, leader):
+        return {login for (login,) in self.db.execute("SELECT login FROM pushed_streamers WHERE worker_id = ?", (leader,))}
+
+    def leave(self):
+        with self.db:
+            self.db.execute("DELETE FROM workers WHERE worker_id = ?", (self.worker_id,))
+
+    def close(self):
+        self.db.close()
+
+
+# This worker's slice of the roster. The ring is rebuilt whenever the set of live workers changes,
+# and only the streamers whose owner changed move to another worker.
+class RosterPartition:
+    def __init__(self, coordinator, vnodes=160):
+        self.coordinator = coordinator
+        self.vnodes = vnodes
+        self.ring = HashRing([coordinator.worker_id], vnodes)
+        self.rebalances = 0
+        self.pushed = set()  # Lowercase logins the leader receives go-lives for through EventSub
+
+    @property
+    def worker_id(self):
+        return self.coordinator.worker_id
+
+    # The leader alone handles slash commands, the EventSub receiver and other once-per-bot work
+    @property
+    def is_leader(self):
+        return self.ring.members[0] == self.worker_id
+
+    def refresh(self):
+        members = self.coordinator.heartbeat()
+        if self.worker_id not in members:
+            members.append(self.worker_id)
+        if tuple(sorted(members)) != self.ring.members:
+            was_leader = self.is_leader
+            self.ring = HashRing(members, self.vnodes)
+            self.rebalances += 1
+            logging.info(f"Roster partition rebalanced across {len(members)} workers: {', '.join(self.ring.members)}")
+            if self.is_leader != was_leader:
+                logging.info(f"Worker {self.worker_id} is {'now' if self.is_leader else 'no longer'} the leader")
+        if not self.is_leader:
+            self.pushed = self.coordinator.pushed(self.ring.members[0])
+
+    def owns(self, login):
+        return self.ring.owner(login.lower()) == self.worker_id
+
+    def owned(self, logins):
+        return [login for login in logins if self.owns(login)]
+
+    # Claim the announcement for one stream (login plus start time) so only one worker posts it
+    def claim_announcement(self, login, started_at):
+        key = f"{login.lower()}:{started_at.isoformat() if hasattr(started_at, 'isoformat') else started_at}"
+        try:
+            return self.coordinator.claim(key)
+        except sqlite3.Error as e:
+            logging.error(f"Error claiming announcement {key}: {e}")
+            return True  # Better a duplicate announcement than a missed one
+
+    # Heartbeat task, runs for the lifetime of the bot
+    async def run(self):
+        while True:
+            try:
+                self.refresh()
+            except sqlite3.Error as e:
+                logging.error(f"Error renewing roster lease for {self.worker_id}: {e}")
+            await asyncio.sleep(self.coordinator.lease_ttl / 3)
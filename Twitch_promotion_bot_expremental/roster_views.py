@@ -0,0 +1,98 @@
+import bisect
+
+import discord
+
+LIST_PAGE_SIZE = 25  # Streamers per /list_twitch_users page, about 2k characters of embed description
+AUTOCOMPLETE_LIMIT = 25  # Discord shows at most 25 autocomplete choices
+
+
+# Alphabetical view over the roster for prefix autocomplete and the paginated list. The sorted logins and the
+# rendered pages are cached until the store's version changes, so lookups between roster changes are a bisect
+# and a page flip is a dict lookup.
+class RosterIndex:
+    def __init__(self, store, page_size=LIST_PAGE_SIZE):
+        self.store = store
+        self.page_size = page_size
+        self.version = None
+        self.keys = []  # Sorted lowercase logins
+        self.logins = []  # Logins as they were added, in the same order
+        self.pages = {}  # page number -> rendered embed
+
+    def refresh(self):
+        if self.version == self.store.version:
+            return
+        pairs = sorted((login.lower(), login) for login in self.store)
+        self.keys = [key for key, _ in pairs]
+        self.logins = [login for _, login in pairs]
+        self.pages.clear()
+        self.version = self.store.version
+
+    # Monitored logins starting with prefix (any capitalisation), alphabetically
+    def complete(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        self.refresh()
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.keys, prefix)
+        matches = []
+        for i in range(start, min(start + limit, len(self.keys))):
+            if not self.keys[i].startswith(prefix):
+                break
+            matches.append(self.logins[i])
+        return matches
+
+    def page_count(self):
+        self.refresh()
+        return max(1, -(-len(self.logins) // self.page_size))
+
+    def page(self, number):
+        self.refresh()
+        embed = self.pages.get(number)
+        if embed is None:
+            logins = self.logins[number * self.page_size:(number + 1) * self.page_size]
+            embed = discord.Embed(
+                title="Monitored Twitch Channels",
+                description="\n".join(f"[{login}](https://twitch.tv/{login})" for login in logins),
+                color=discord.Color.purple()
+            )
+            embed.set_footer(text=f"Page {number + 1}/{self.page_count()} - {len(self.logins)} streamers")
+            self.pages[number] = embed
+        return embed
+
+
+# First/previous/next/last buttons over a RosterIndex, only usable by the member who ran the command
+class RosterPageView(discord.ui.View):
+    def __init__(self, index, owner, timeout=180):
+        super().__init__(timeout=timeout)
+        self.index = index
+        self.owner = owner
+        self.number = 0
+        self.update_buttons()
+
+    def update_buttons(self):
+        last = self.index.page_count() - 1
+        self.first.disabled = self.previous.disabled = self.number <= 0
+        self.next.disabled = self.last.disabled = self.number >= last
+
+    async def show(self, interaction, number):
+        if interaction.user != self.owner:
+            await interaction.response.send_message("You didn't initiate this command.", ephemeral=True)
+            return
+        # The roster may have changed since the last page was shown
+        self.number = max(0, min(number, self.index.page_count() - 1))
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.index.page(self.number), view=self)
+
+    @discord.ui.button(label="<<", style=discord.ButtonStyle.grey)
+    async def first(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, 0)
+
+    @discord.ui.button(label="<", style=discord.ButtonStyle.grey)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.number - 1)
+
+    @discord.ui.button(label=">", style=discord.ButtonStyle.grey)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.number + 1)
+
+    @discord.ui.button(label=">>", style=discord.ButtonStyle.grey)
+    async def last(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.index.page_count() - 1)
@@ -0,0 +1,80 @@
+import json
+import logging
+import os
+
+
+# Append-only journal of changes to a set of dicts, compacted into a snapshot every compact_every entries.
+# Each change is one short JSON line flushed to the OS, so recording a transition costs a single write.
+class StateJournal:
+    def __init__(self, path, tables, compact_every=1000):
+        self.path = path
+        self.snapshot_path = path + ".snapshot"
+        self.tables = tables  # name -> dict, updated in place by load() and dumped by compact()
+        self.compact_every = compact_every
+        self.entries = 0
+        self.file = None
+
+    # Rebuild the dicts from the last snapshot plus every journal entry written after it
+    def load(self):
+        try:
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "r") as file:
+                    snapshot = json.load(file)
+                for name, table in self.tables.items():
+                    table.update(snapshot.get(name, {}))
+            if os.path.exists(self.path):
+                with open(self.path, "r") as file:
+                    for line in file:
+                        try:
+                            name, key, value = json.loads(line)
+                        except ValueError:
+                            # A crash can leave the last line half written
+                            logging.warning(f"Skipping unreadable entry in state journal {self.path}")
+                            continue
+                        self.apply(name, key, value)
+                        self.entries += 1
+            logging.info(f"Loaded state from {self.snapshot_path} and {self.entries} journal entries")
+        except (OSError, ValueError) as e:
+            logging.error(f"Error loading state journal {self.path}: {e}")
+        self.file = open(self.path, "a")
+
+    def apply(self, name, key, value):
+        table = self.tables.get(name)
+        if table is None:
+            return
+        if value is None:
+            table.pop(key, None)
+        else:
+            table[key] = value
+
+    # Apply one change and append it to the journal (value None means the key was removed)
+    def record(self, name, key, value):
+        self.apply(name, key, value)
+        if self.file is None:
+            return
+        try:
+            self.file.write(json.dumps([name, key, value]) + "\n")
+            self.file.flush()
+            self.entries += 1
+            if self.entries >= self.compact_every:
+                self.compact()
+        except OSError as e:
+            logging.error(f"Error writing state journal {self.path}: {e}")
+
+    # Write the current dicts to a new snapshot and start an empty journal
+    def compact(self):
+        temp_path = self.snapshot_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump(self.tables, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.path, "w")
+        self.entries = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
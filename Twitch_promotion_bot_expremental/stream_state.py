@@ -0,0 +1,147 @@
+import bisect
+import logging
+
+WENT_LIVE = 'went_live'
+WENT_OFFLINE = 'went_offline'
+TITLE_CHANGED = 'title_changed'
+GAME_CHANGED = 'game_changed'
+VIEWER_MILESTONE = 'viewer_milestone'
+EVENT_TYPES = (WENT_LIVE, WENT_OFFLINE, TITLE_CHANGED, GAME_CHANGED, VIEWER_MILESTONE)
+
+# Viewer counts that emit a viewer_milestone the first time a stream reaches them
+VIEWER_MILESTONES = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+
+# Last known state of one streamer. The journal keeps it as a short list (to_row/from_row);
+# viewers, user_id and started_at only matter while the bot is running and are not persisted.
+class StreamState:
+    __slots__ = ('is_live', 'title', 'game', 'went_live_at', 'milestone', 'viewers', 'user_id', 'started_at')
+
+    def __init__(self, is_live=False, title=None, game=None, went_live_at=0, milestone=0):
+        self.is_live = is_live
+        self.title = title
+        self.game = game
+        self.went_live_at = went_live_at  # Time of the last offline -> live transition, for the notification cooldown
+        self.milestone = milestone  # Number of VIEWER_MILESTONES reached during the current stream
+        self.viewers = 0
+        self.user_id = None
+        self.started_at = None
+
+    def to_row(self):
+        return [self.is_live, self.title, self.game, self.went_live_at, self.milestone]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+
+# One transition of one streamer. previous is the old title, game or milestone for the *_changed and milestone events.
+class StreamEvent:
+    __slots__ = ('kind', 'username', 'state', 'stream_info', 'time', 'previous')
+
+    def __init__(self, kind, username, state, stream_info, time, previous=None):
+        self.kind = kind
+        self.username = username
+        self.state = state
+        self.stream_info = stream_info
+        self.time = time
+        self.previous = previous
+
+
+# Diffs live status snapshots (from sweeps and EventSub) against the stored state and emits an event for every
+# actual transition to the callbacks subscribed to its kind. A snapshot that changes nothing emits nothing, so
+# subscribers (announcements, metrics, persistence) only do work when something happened.
+class StreamStateTracker:
+    def __init__(self, milestones=VIEWER_MILESTONES):
+        self.milestones = milestones
+        self.states = {}  # username -> StreamState, only for streamers seen live at least once
+        self.subscribers = {kind: [] for kind in EVENT_TYPES}
+        self.live_count = 0
+
+    def subscribe(self, kinds, callback):
+        for kind in (kinds,) if isinstance(kinds, str) else kinds:
+            self.subscribers[kind].append(callback)
+
+    # Restore the states saved by a persistence subscriber (username -> to_row())
+    def restore(self, rows):
+        for username, row in rows.items():
+            self.states[username] = StreamState.from_row(row)
+        self.live_count = sum(1 for state in self.states.values() if state.is_live)
+
+    def get(self, username):
+        return self.states.get(username)
+
+    def is_live(self, username):
+        state = self.states.get(username)
+        return state is not None and state.is_live
+
+    def went_live_at(self, username):
+        state = self.states.get(username)
+        return state.went_live_at if state is not None else 0
+
+    # Drop a streamer's state without emitting anything (removed from the roster or handed to another worker)
+    def forget(self, username):
+        state = self.states.pop(username, None)
+        if state is not None and state.is_live:
+            self.live_count -= 1
+        return state is not None
+
+    def milestone_for(self, viewers):
+        return bisect.bisect_right(self.milestones, viewers)
+
+    # Diff one snapshot ({'is_live': ..., 'title': ..., 'game': ..., 'viewers': ...}) and emit its events
+    def apply(self, username, stream_info, current_time):
+        state = self.states.get(username)
+        events = []
+        if stream_info['is_live']:
+            if state is None:
+                state = self.states[username] = StreamState()
+            viewers = stream_info.get('viewers') or 0
+            if not state.is_live:
+                state.is_live = True
+                state.title = stream_info['title']
+                state.game = stream_info['game']
+                state.went_live_at = current_time
+                state.milestone = self.milestone_for(viewers)  # Starting above a milestone does not count as reaching it
+                self.live_count += 1
+                events.append(StreamEvent(WENT_LIVE, username, state, stream_info, current_time))
+            else:
+                # None means the value was not known (state restored from an older journal), not that it changed
+                title = stream_info['title']
+                if title != state.title:
+                    if state.title is not None:
+                        events.append(StreamEvent(TITLE_CHANGED, username, state, stream_info, current_time, state.title))
+                    state.title = title
+                game = stream_info['game']
+                if game != state.game:
+                    if state.game is not None:
+                        events.append(StreamEvent(GAME_CHANGED, username, state, stream_info, current_time, state.game))
+                    state.game = game
+                milestone = self.milestone_for(viewers)
+                if milestone > state.milestone:
+                    events.append(StreamEvent(VIEWER_MILESTONE, username, state, stream_info, current_time, state.milestone))
+                    state.milestone = milestone
+            state.viewers = viewers
+            state.user_id = stream_info.get('user_id') or state.user_id
+            state.started_at = stream_info.get('started_at') or state.started_at
+        elif state is not None and state.is_live:
+            state.is_live = False
+            state.milestone = 0
+            state.viewers = 0
+            state.started_at = None
+            self.live_count -= 1
+            events.append(StreamEvent(WENT_OFFLINE, username, state, stream_info, current_time))
+        for event in events:
+            self.emit(event)
+        return events
+
+    def emit(self, event):
+        for callback in self.subscribers[event.kind]:
+            try:
+                callback(event)
+            except Exception as e:
+                logging.error(f"Error handling {event.kind} for {event.username}: {e}")
+
+    # Highest viewer milestone the stream has reached, for the viewer_milestone event
+    def milestone_viewers(self, state):
+        return self.milestones[state.milestone - 1] if state.milestone else 0
@@ -0,0 +1,140 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+
+
+# Monitored streamers kept in SQLite (WAL mode) with a dict-backed in-memory view for O(1) membership.
+# Logins are unique case-insensitively and every change is a single-row write.
+class StreamerStore:
+    def __init__(self, path, json_path=None):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS streamers ("
+            "login TEXT NOT NULL, "
+            "user_id TEXT, "
+            "is_live INTEGER NOT NULL DEFAULT 0, "
+            "last_notified REAL NOT NULL DEFAULT 0, "
+            "added_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE UNIQUE INDEX IF NOT EXISTS streamers_login ON streamers (login COLLATE NOCASE)")
+        self.db.commit()
+        if json_path and os.path.exists(json_path):
+            self.migrate_json(json_path)
+        self.logins = {}  # lowercase login -> login as it was added, in insertion order
+        self.user_ids = {}  # lowercase login -> resolved Twitch user id, stable across account renames
+        self.version = 0  # Bumped on every change to the roster, for views cached over it
+        self.reload()
+
+    def reload(self):
+        rows = self.db.execute("SELECT login, user_id FROM streamers ORDER BY rowid").fetchall()
+        self.logins = {login.lower(): login for login, _ in rows}
+        self.user_ids = {login.lower(): user_id for login, user_id in rows if user_id}
+        self.data_version = self.db.execute("PRAGMA data_version").fetchone()[0]
+        self.version += 1
+
+    # Pick up streamers added or removed by another process sharing the database, returns True if anything changed
+    def reload_if_changed(self):
+        if self.db.execute("PRAGMA data_version").fetchone()[0] == self.data_version:
+            return False
+        self.reload()
+        return True
+
+    # One-shot import of the old twitch_usernames.json list, the file is renamed once imported
+    def migrate_json(self, json_path):
+        try:
+            with open(json_path, "r") as file:
+                usernames = json.load(file)
+            now = time.time()
+            rows = [(username, now) for username in usernames if username]
+            with self.db:
+                self.db.executemany("INSERT OR IGNORE INTO streamers (login, added_at) VALUES (?, ?)", rows)
+            os.replace(json_path, json_path + ".migrated")
+            logging.info(f"Migrated {len(rows)} Twitch usernames from {json_path}")
+        except (OSError, ValueError, sqlite3.Error) as e:
+            logging.error(f"Error migrating Twitch usernames from {json_path}: {e}")
+
+    # Login as it was added for any capitalisation of it, or None if it is not monitored
+    def lookup(self, login):
+        return self.logins.get(login.lower())
+
+    def __contains__(self, login):
+        return login.lower() in self.logins
+
+    # Iterate over a snapshot so the roster can change while a sweep walks it
+    def __iter__(self):
+        return iter(list(self.logins.values()))
+
+    def __len__(self):
+        return len(self.logins)
+
+    def __repr__(self):
+        return repr(list(self.logins.values()))
+
+    # Add a login, returns False if it is already monitored
+    def add(self, login):
+        if login in self:
+            return False
+        with self.db:
+            self.db.execute("INSERT OR IGNORE INTO streamers (login, added_at) VALUES (?, ?)", (login, time.time()))
+        self.logins[login.lower()] = login
+        self.version += 1
+        return True
+
+    # Remove a login, returns False if it was not monitored
+    def remove(self, login):
+        if login not in self:
+            return False
+        with self.db:
+            self.db.execute("DELETE FROM streamers WHERE login = ? COLLATE NOCASE", (login,))
+        del self.logins[login.lower()]
+        self.user_ids.pop(login.lower(), None)
+        self.version += 1
+        return True
+
+    # Record the resolved user id, live state and last notification time for a login
+    def update_state(self, login, user_id=None, is_live=None, last_notified=None):
+        if login not in self:
+            return
+        with self.db:
+            self.db.execute(
+                "UPDATE streamers SET "
+                "user_id = COALESCE(?, user_id), "
+                "is_live = COALESCE(?, is_live), "
+                "last_notified = COALESCE(?, last_notified) "
+                "WHERE login = ? COLLATE NOCASE",
+                (user_id, None if is_live is None else int(is_live), last_notified, login)
+            )
+        if user_id is not None:
+            self.user_ids[login.lower()] = user_id
+
+    # User id stored for a login, or None if it was never resolved
+    def user_id(self, login):
+        return self.user_ids.get(login.lower())
+
+    # Record resolved user ids for several logins with a single write, logins that are not monitored are skipped
+    def set_user_ids(self, items):
+        rows = [
+            (user_id, login) for login, user_id in items
+            if login in self and self.user_ids.get(login.lower()) != user_id
+        ]
+        if not rows:
+            return
+        with self.db:
+            self.db.executemany("UPDATE streamers SET user_id = ? WHERE login = ? COLLATE NOCASE", rows)
+        for user_id, login in rows:
+            self.user_ids[login.lower()] = user_id
+
+    def get_state(self, login):
+        row = self.db.execute(
+            "SELECT user_id, is_live, last_notified FROM streamers WHERE login = ? COLLATE NOCASE", (login,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {'user_id': row[0], 'is_live': bool(row[1]), 'last_notified': row[2]}
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import random
+import time
+
+
+# Trips after failure_threshold consecutive failures and rejects calls for reset_timeout seconds,
+# then lets a single trial call through (half open) to decide whether to close again
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=300):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        return self.state != self.OPEN
+
+    # Seconds until the breaker lets a trial call through
+    def seconds_until_retry(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logging.info(f"Circuit breaker for {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.opened_at is None and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self.trips += 1
+            logging.error(f"Circuit breaker for {self.name} opened after {self.failures} failures, pausing {self.reset_timeout}s")
+
+
+# Restart bookkeeping for one supervised component
+class Component:
+    __slots__ = ('name', 'breaker', 'retries', 'restarts', 'consecutive_failures', 'last_error')
+
+    def __init__(self, name, breaker):
+        self.name = name
+        self.breaker = breaker
+        self.retries = 0  # Failed attempts since the bot started
+        self.restarts = 0  # Successful restarts since the bot started
+        self.consecutive_failures = 0
+        self.last_error = None
+
+
+# Restarts individual components (the Twitch client, the polling task, the gateway connection) in process,
+# with jittered exponential backoff and a circuit breaker per component, instead of re-executing the bot
+class Supervisor:
+    def __init__(self, base_delay=5, max_delay=600, failure_threshold=5, reset_timeout=300, healthy_after=300):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.healthy_after = healthy_after  # A run lasting this long resets the backoff
+        self.components = {}
+        self.locks = {}
+
+    def component(self, name):
+        component = self.components.get(name)
+        if component is None:
+            breaker = CircuitBreaker(name, self.failure_threshold, self.reset_timeout)
+            component = self.components[name] = Component(name, breaker)
+        return component
+
+    def available(self, name):
+        return self.component(name).breaker.allow()
+
+    # Full jitter: a random delay up to the exponential backoff, so restarts of many components do not line up
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def record_failure(self, component, error):
+        component.retries += 1
+        component.consecutive_failures += 1
+        component.last_error = str(error)
+        component.breaker.record_failure()
+
+    def record_success(self, component):
+        component.consecutive_failures = 0
+        component.breaker.record_success()
+
+    # Wait out the backoff (and the breaker, if it is open) before the next attempt
+    async def wait_before_retry(self, component):
+        delay = max(self.backoff(component.consecutive_failures), component.breaker.seconds_until_retry())
+        logging.warning(f"Restarting {component.name} in {delay:.1f}s (attempt {component.consecutive_failures + 1})")
+        await asyncio.sleep(delay)
+
+    # Re-run start() until it succeeds. Concurrent callers share one recovery instead of each restarting the component.
+    async def recover(self, name, start, error=None):
+        component = self.component(name)
+        lock = self.locks.setdefault(name, asyncio.Lock())
+        if lock.locked():
+            async with lock:
+                return
+        async with lock:
+            if error is not None:
+                logging.error(f"{name} failed: {error}")
+                self.record_failure(component, error)
+            while True:
+                await self.wait_before_retry(component)
+                try:
+                    if await start() is False:
+                        raise RuntimeError(f"{name} did not start")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.error(f"Restarting {name} failed: {e}")
+                    self.record_failure(component, e)
+                    continue
+                component.restarts += 1
+                self.record_success(component)
+                logging.info(f"Restarted {name}")
+                return
+
+    # Keep a long-running coroutine alive: whenever run() raises it is started again after a backoff.
+    # Returns when run() returns normally, exceptions in fatal are re-raised.
+    async def run(self, name, run, fatal=()):
+        component = self.component(name)
+        while True:
+            started = time.monotonic()
+            try:
+                return await run()
+            except asyncio.CancelledError:
+                raise
+            except fatal:
+                raise
+            except Exception as e:
+                logging.error(f"{name} crashed: {e}")
+                if time.monotonic() - started >= self.healthy_after:
+                    self.record_success(component)
+                self.record_failure(component, e)
+            await self.wait_before_retry(component)
+            component.restarts += 1
+
+    def stats(self):
+        return "; ".join(
+            f"{component.name}: {component.breaker.state}, {component.retries} failures, {component.restarts} restarts"
+            for component in self.components.values()
+        )
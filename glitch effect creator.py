@@ -1,8 +1,19 @@
 from PIL import Image
+from PIL.GifImagePlugin import getheader, getdata
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool, shared_memory
 import numpy as np
 import imageio
-import random
+import argparse
+import glob
+import hashlib
+import itertools
+import json
 import os
+import shutil
+import tempfile
+import time
 
 # ——— CONFIG ———
 input_path = 'ChatGPT Image Apr 23, 2025, 03_21_32 AM.png'   # your static banner file
@@ -11,41 +22,358 @@ output_mp4  = 'glitch.mp4'
 fps         = 20
 duration_s  = 3
 max_shift   = 0.03   # fraction of width for glitch shift
+workers     = os.cpu_count() or 1   # render processes, 1 renders in this process
+seed        = None   # fixed integer to reproduce the same animation (and reuse cached renders), None for a new one every run
+cache_dir   = '.glitch_cache'   # finished seeded renders, keyed on the image and every setting that changes the output
 # ————————
 
-# Load base image
-banner = Image.open(input_path).convert('RGB')
-arr = np.array(banner)
-h, w, _ = arr.shape
-num_frames = fps * duration_s
-
-def glitch_frame(src):
-    img = src.copy()
-    # Random horizontal band shifts
-    for _ in range(random.randint(3, 7)):
-        y       = random.randint(0, h-1)
-        band_h  = random.randint(1, int(h * 0.05))
-        shift   = random.randint(int(-w*max_shift), int(w*max_shift))
-        patch   = img[y:y+band_h].copy()
-        img[y:y+band_h] = 0
-        if shift > 0:
-            img[y:y+band_h, shift:] = patch[:, :-shift]
-        elif shift < 0:
-            img[y:y+band_h, :w+shift] = patch[:, -shift:]
-    # Scan-line effect
-    img[::2] = (img[::2] * 0.7).astype(np.uint8)
-    return img
-
-# Generate all frames
-frames = [glitch_frame(arr) for _ in range(num_frames)]
-
-# Save GIF
-imageio.mimsave(output_gif, frames, fps=fps, loop=0)
-
-# Save MP4 (requires ffmpeg)
-writer = imageio.get_writer(output_mp4, fps=fps, codec='libx264')
-for f in frames:
-    writer.append_data(f)
-writer.close()
-
-print(f"Exported:\n  • GIF → {os.path.abspath(output_gif)}\n  • MP4 → {os.path.abspath(output_mp4)}")
+min_bands   = 3      # horizontal bands shifted per frame
+max_bands   = 7
+max_band_h  = 0.05   # fraction of height for a band
+batch       = 8      # frames rendered per batch, the only frames held in memory while encoding
+ring_slots  = 2      # shared frame buffers per worker, bounds how far rendering runs ahead of the encoders
+scanline    = 0.7    # brightness of the darkened scan lines
+effect_version = 1   # bump when the effect or the encoding changes, so older cached renders are not reused
+
+# Scan-line darkening as a lookup table, same values as (v * scanline).astype(np.uint8)
+scanline_lut = (np.arange(256) * scanline).astype(np.uint8)
+
+# Frame i always draws from substream i of the run's seed, so the animation does not depend on
+# how frames are split between batches or worker processes
+def frame_rng(seed, i):
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(i,)))
+
+# Band parameters for frames first..first+n-1: per frame min_bands..max_bands bands, each a (y, height, shift)
+def draw_bands(seed, first, n, h, w, max_shift):
+    counts  = np.empty(n, dtype=np.int64)
+    ys      = np.empty((n, max_bands), dtype=np.int64)
+    heights = np.empty((n, max_bands), dtype=np.int64)
+    shifts  = np.empty((n, max_bands), dtype=np.int64)
+    for j in range(n):
+        rng        = frame_rng(seed, first + j)
+        counts[j]  = rng.integers(min_bands, max_bands + 1)
+        ys[j]      = rng.integers(0, h, max_bands)
+        heights[j] = rng.integers(1, max(1, int(h * max_band_h)) + 1, max_bands)
+        shifts[j]  = rng.integers(int(-w*max_shift), int(w*max_shift) + 1, max_bands)
+    return counts, ys, heights, shifts
+
+# Fold each frame's bands into a per-row shift plus the span of columns [lo, hi) that still hold image data.
+# Bands apply in order: where they overlap the shifts add up and each one cuts more off the row,
+# and a band with zero shift is blanked.
+def row_shifts(counts, ys, heights, shifts, h, w):
+    n      = len(counts)
+    rows   = np.arange(h)
+    offset = np.zeros((n, h), dtype=np.int32)
+    lo     = np.zeros((n, h), dtype=np.int32)
+    hi     = np.full((n, h), w, dtype=np.int32)
+    for band in range(max_bands):
+        y       = ys[:, band, None]
+        in_band = (rows >= y) & (rows < y + heights[:, band, None]) & (band < counts)[:, None]
+        shift   = np.where(in_band, shifts[:, band, None], 0)
+        offset += shift
+        lo      = np.clip(lo + shift, 0, w)
+        hi      = np.clip(hi + shift, 0, w)
+        hi[in_band & (shift == 0)] = 0
+    return offset, lo, hi
+
+# Scan-lined copy of the source: rows never move, so darkening before shifting gives the same pixels
+def scanlined(src):
+    base = src.copy()
+    base[::2] = scanline_lut[base[::2]]
+    return base
+
+# Frames first..first+n-1 in one pass: start every frame from the scan-lined image, then copy in each run of
+# rows that share a frame and a shift as one slice; a frame has at most max_bands such runs, so this is a
+# handful of block copies per frame
+def glitch_frames(base, seed, first, n, max_shift, out=None):
+    h, w, _ = base.shape
+    if out is None:
+        out = np.empty((n, h, w, 3), dtype=np.uint8)
+    offset, lo, hi = row_shifts(*draw_bands(seed, first, n, h, w, max_shift), h, w)
+    out[:] = base
+    f, r = np.nonzero((offset != 0) | (lo > 0) | (hi < w))
+    if len(f) == 0:
+        return out
+    t, l, u = offset[f, r], lo[f, r], hi[f, r]
+    run_break = (np.diff(f) != 0) | (np.diff(r) != 1) | (np.diff(t) != 0) | (np.diff(l) != 0) | (np.diff(u) != 0)
+    starts = np.flatnonzero(np.r_[True, run_break])
+    ends   = np.r_[starts[1:], len(f)]
+    for a, b in zip(starts.tolist(), ends.tolist()):
+        block = out[f[a], r[a]:r[b-1]+1]
+        block[:, :l[a]] = 0
+        block[:, u[a]:] = 0
+        if u[a] > l[a]:
+            block[:, l[a]:u[a]] = base[r[a]:r[b-1]+1, l[a]-t[a]:u[a]-t[a]]
+    return out
+
+# Yield n frames one at a time, rendered `batch` at a time into one reused buffer, so memory does not grow
+# with the clip length. Each frame is only valid until the next one is requested.
+def glitch_stream(src, seed, n, max_shift):
+    base = scanlined(src)
+    buf  = np.empty((min(batch, n), *src.shape), dtype=np.uint8)
+    for start in range(0, n, batch):
+        count = min(batch, n - start)
+        yield from glitch_frames(base, seed, start, count, max_shift, out=buf[:count])
+
+# Median-cut palette image for the GIF, by far the slowest step per frame
+def quantize(frame):
+    return Image.fromarray(frame).quantize(256)
+
+# Animated GIF written one frame at a time from quantized frames, each with its own color table
+# (imageio's default GIF writer keeps every frame until it is closed)
+class GifStream:
+    def __init__(self, path, fps, loop=0):
+        self.file     = open(path, 'wb')
+        self.duration = 1000 / fps
+        self.loop     = loop
+        self.frames   = 0
+
+    def append(self, frame):
+        if self.frames == 0:
+            self.file.write(b''.join(getheader(frame, info={'loop': self.loop})[0]))
+        self.file.write(b''.join(getdata(frame, duration=self.duration, disposal=2, include_color_table=True)))
+        self.frames += 1
+
+    def close(self):
+        self.file.write(b';')
+        self.file.close()
+
+# ——— parallel render: worker processes render and quantize frames into a shared-memory ring buffer ———
+
+# Worker-side views of the shared base image and ring buffer, attached once per process
+shared = {}
+
+def shared_array(shm, shape):
+    return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+
+def attach_worker(names, shape, slots, seed, max_shift):
+    h, w, _ = shape
+    shared['blocks'] = [shared_memory.SharedMemory(name=name) for name in names]
+    shared['base']   = shared_array(shared['blocks'][0], shape)
+    shared['rgb']    = shared_array(shared['blocks'][1], (slots, h, w, 3))
+    shared['index']  = shared_array(shared['blocks'][2], (slots, h, w))
+    shared['seed']   = seed
+    shared['max_shift'] = max_shift
+
+# Render frame i into ring slot `slot`, quantize it into the matching index slot and return the GIF palette
+def render_slot(i, slot):
+    rgb = shared['rgb'][slot:slot+1]
+    glitch_frames(shared['base'], shared['seed'], i, 1, shared['max_shift'], out=rgb)
+    frame = quantize(rgb[0])
+    shared['index'][slot] = np.asarray(frame)
+    return frame.getpalette()
+
+# Hand slots to the pool and pass finished frames to encode(rgb, gif_frame) strictly in frame order;
+# slot i % slots goes back to the pool only once frame i has been encoded
+def consume_ring(blocks, shape, slots, seed, max_shift, n, workers, encode):
+    h, w, _ = shape
+    rgb   = shared_array(blocks[1], (slots, h, w, 3))
+    index = shared_array(blocks[2], (slots, h, w))
+    names = [block.name for block in blocks]
+    with Pool(workers, initializer=attach_worker, initargs=(names, shape, slots, seed, max_shift)) as pool:
+        pending = deque(pool.apply_async(render_slot, (i, i)) for i in range(slots))
+        for i in range(n):
+            palette = pending.popleft().get()
+            slot    = i % slots
+            frame   = Image.frombuffer('P', (w, h), index[slot], 'raw', 'P', 0, 1)
+            frame.putpalette(palette)
+            encode(rgb[slot], frame)
+            if i + slots < n:
+                pending.append(pool.apply_async(render_slot, (i + slots, slot)))
+
+# Render n frames with `workers` processes. The scan-lined base image is copied into shared memory once
+# instead of being pickled per task, and workers * ring_slots frames are in flight at most.
+def parallel_render(src, seed, max_shift, n, workers, encode):
+    h, w, _ = src.shape
+    slots   = min(n, workers * ring_slots)
+    blocks  = [
+        shared_memory.SharedMemory(create=True, size=size)
+        for size in (src.nbytes, slots * h * w * 3, slots * h * w)
+    ]
+    try:
+        shared_array(blocks[0], src.shape)[:] = scanlined(src)
+        consume_ring(blocks, src.shape, slots, seed, max_shift, n, workers, encode)
+    finally:
+        for block in blocks:
+            block.unlink()
+            block.close()
+
+# ——— render cache: a seeded render is a pure function of the image and the settings ———
+
+# Content address of a render: hash of the input file plus every setting that changes the frames or the encoding
+def cache_key(path, run_seed, fps, duration_s, max_shift):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    settings = {
+        'image': digest.hexdigest(), 'fps': fps, 'duration_s': duration_s, 'max_shift': max_shift, 'seed': run_seed,
+        'min_bands': min_bands, 'max_bands': max_bands, 'max_band_h': max_band_h, 'scanline': scanline,
+        'codec': 'libx264', 'version': effect_version,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+
+def cache_paths(key):
+    return os.path.join(cache_dir, key + '.gif'), os.path.join(cache_dir, key + '.mp4')
+
+# Copy a finished render into the cache; files are renamed into place, so a cached pair is never half-written
+def store_render(key, gif_path, mp4_path):
+    os.makedirs(cache_dir, exist_ok=True)
+    for src, dst in zip((gif_path, mp4_path), cache_paths(key)):
+        # Batch renders share one process, so the temporary name has to be unique per call, not per PID
+        with tempfile.NamedTemporaryFile(dir=cache_dir, suffix='.tmp', delete=False) as tmp:
+            with open(src, 'rb') as file:
+                shutil.copyfileobj(file, tmp)
+        os.replace(tmp.name, dst)
+
+# Copy a cached render to the output paths, False if there is none
+def load_render(key, gif_path, mp4_path):
+    cached = cache_paths(key)
+    if not all(os.path.exists(path) for path in cached):
+        return False
+    for src, dst in zip(cached, (gif_path, mp4_path)):
+        shutil.copyfile(src, dst)
+    return True
+
+def render(src, run_seed, gif_path, mp4_path, fps, duration_s, max_shift, workers):
+    num_frames = fps * duration_s
+    if num_frames < 1:
+        raise ValueError(f'{fps} fps for {duration_s}s is no frames')
+
+    # Feed every frame to both encoders as it is rendered; ffmpeg encodes the MP4 in its own process
+    gif_writer = GifStream(gif_path, fps, loop=0)
+    try:
+        with imageio.get_writer(mp4_path, fps=fps, codec='libx264') as mp4_writer:  # MP4 requires ffmpeg
+            def encode(frame, gif_frame):
+                gif_writer.append(gif_frame)
+                mp4_writer.append_data(frame)
+
+            if workers > 1:
+                parallel_render(src, run_seed, max_shift, num_frames, workers, encode)
+            else:
+                for frame in glitch_stream(src, run_seed, num_frames, max_shift):
+                    encode(frame, quantize(frame))
+    finally:
+        gif_writer.close()
+
+# Render one banner, or copy it from the cache for a seeded run that was rendered before.
+# Returns where it came from ('render' or 'cache') and the seed, so unseeded renders can be reproduced later.
+def export(input_path, gif_path, mp4_path, fps=fps, duration_s=duration_s, max_shift=max_shift, seed=seed, workers=workers):
+    # Unseeded runs get fresh entropy and are never repeated, so only seeded runs go through the cache
+    key = cache_key(input_path, seed, fps, duration_s, max_shift) if seed is not None else None
+    if key is not None and load_render(key, gif_path, mp4_path):
+        return 'cache', seed
+    run_seed = seed if seed is not None else np.random.SeedSequence().entropy
+    # Load base image
+    banner = Image.open(input_path).convert('RGB')
+    render(np.array(banner), run_seed, gif_path, mp4_path, fps, duration_s, max_shift, workers)
+    if key is not None:
+        store_render(key, gif_path, mp4_path)
+    return 'render', run_seed
+
+# ——— batch mode: every image × every parameter combination in one process ———
+
+image_extensions = ('.png', '.jpg', '.jpeg', '.webp', '.bmp', '.gif')
+
+# Directories contribute their image files, anything else is a glob pattern; sorted and without duplicates
+def expand_inputs(patterns):
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths += [os.path.join(pattern, name) for name in os.listdir(pattern) if name.lower().endswith(image_extensions)]
+        else:
+            matches = glob.glob(pattern)
+            if not matches:
+                print(f'Skipping {pattern}: no such file')
+            paths += matches
+    # The same file reached through two spellings (a.png and ./a.png) is rendered once
+    unique = {}
+    for path in sorted(paths):
+        unique.setdefault(os.path.realpath(path), path)
+    return sorted(unique.values())
+
+def run_job(job):
+    started = time.perf_counter()
+    try:
+        job['source'], job['seed'] = export(
+            job['input'], job['gif'], job['mp4'], job['fps'], job['duration_s'], job['max_shift'], job['seed'], workers=1,
+        )
+    except Exception as e:
+        job['error'] = f'{type(e).__name__}: {e}'
+    job['seconds'] = round(time.perf_counter() - started, 3)
+    return job
+
+# Each job renders in this process and jobs run on a thread pool: quantizing, frame copies and ffmpeg all run
+# outside the GIL, and the libraries are imported once for the whole batch instead of once per image.
+def run_batch(args):
+    inputs = expand_inputs(args.inputs)
+    if not inputs:
+        raise SystemExit(f'No images match {" ".join(args.inputs)}')
+    os.makedirs(args.out, exist_ok=True)
+    stems = {}  # realpath -> output name prefix
+    jobs = []
+    seen = set()
+    for path, fps_, duration, shift, seed_ in itertools.product(inputs, args.fps, args.duration, args.max_shift, args.seed):
+        # Repeated grid values would render the same thing twice into the same files
+        real_path = os.path.realpath(path)
+        if (real_path, fps_, duration, shift, seed_) in seen:
+            continue
+        seen.add((real_path, fps_, duration, shift, seed_))
+        stem = stems.get(real_path)
+        if stem is None:
+            # Directory and file name together, so banners with the same name in different folders do not collide;
+            # a_b.png and a/b.png still flatten to the same name, so later ones get a hash of their path
+            stem = os.path.splitext(os.path.relpath(path))[0].replace(os.sep, '_').lstrip('._')
+            if stem in stems.values():
+                stem += '_' + hashlib.sha256(real_path.encode()).hexdigest()[:8]
+            stems[real_path] = stem
+        name = f'{stem}_{fps_}fps_{duration}s_shift{shift}' + (f'_seed{seed_}' if seed_ is not None else '')
+        jobs.append({
+            'input': path, 'gif': os.path.join(args.out, name + '.gif'), 'mp4': os.path.join(args.out, name + '.mp4'),
+            'fps': fps_, 'duration_s': duration, 'max_shift': shift, 'seed': seed_,
+        })
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.jobs) as pool:
+        for job in pool.map(run_job, jobs):
+            status = job.get('error') or f"{job['source']} in {job['seconds']}s"
+            print(f"  • {job['input']} {job['fps']}fps {job['duration_s']}s shift {job['max_shift']} → {job['gif']} ({status})")
+    total = round(time.perf_counter() - started, 3)
+
+    manifest = os.path.join(args.out, 'manifest.json')
+    with open(manifest, 'w') as file:
+        json.dump({'seconds': total, 'jobs': jobs}, file, indent=2)
+    failed = sum(1 for job in jobs if 'error' in job)
+    print(f"{len(jobs) - failed}/{len(jobs)} renders in {total}s, manifest → {os.path.abspath(manifest)}")
+    return 1 if failed else 0
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'{value} is not at least 1')
+    return number
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Glitch-animate banners. Without inputs, renders the single banner from the config block.'
+    )
+    parser.add_argument('inputs', nargs='*', help='image files, directories or glob patterns')
+    parser.add_argument('--out', default='glitch_out', help='output directory for the renders and manifest.json')
+    parser.add_argument('--fps', type=positive_int, nargs='+', default=[fps])
+    parser.add_argument('--duration', type=positive_int, nargs='+', default=[duration_s], help='seconds')
+    parser.add_argument('--max-shift', type=float, nargs='+', default=[max_shift], help='fraction of width')
+    parser.add_argument('--seed', type=int, nargs='+', default=[seed], help='omit for a new animation per render')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='renders running at once')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.inputs:
+        return run_batch(args)
+
+    source, _ = export(input_path, output_gif, output_mp4)
+    print(f"Exported ({source}):\n  • GIF → {os.path.abspath(output_gif)}\n  • MP4 → {os.path.abspath(output_mp4)}")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())